@@ -14,17 +14,65 @@ import csv
 import io
 from urllib.parse import urljoin, urlparse
 
+import catalog_batch
+import ct_batch
+import ct_extract
+import exports
+import http_cache
+import jobs
+import link_check
+import pi_pdf
+import product_matcher
+import search_index
+import similarity
+import sitemap
+from page_model import ParsedPage
+from schema_merge import SchemaMerger
+
 # Set up page config and title
 st.set_page_config(page_title="Pharmaceutical Website Data Extractor", layout="wide")
 st.title("Pharmaceutical Website Data Extractor")
 
-# Create tabs
-tab1, tab2, tab3, tab4 = st.tabs([
-    "🔍 Crawl Website", 
-    "💊 Generate Drug Schema", 
-    "🧪 Generate Clinical Trial Schema", 
-    "🔗 Find Similar Sites"
-])
+# Views; only the selected one runs on each rerun
+VIEWS = [
+    "🔍 Crawl Website",
+    "💊 Generate Drug Schema",
+    "🧪 Generate Clinical Trial Schema",
+    "🔗 Find Similar Sites",
+    "🔎 Search Past Crawls"
+]
+active_view = st.radio("View", VIEWS, horizontal=True, key="active_view", label_visibility="collapsed")
+
+# Streamlit drops the state of widgets that are not drawn, so carry the
+# inputs of hidden views over to the next rerun (the active view's widgets
+# keep their own state, and setting it here too would override their defaults)
+VIEW_INPUTS = {
+    VIEWS[0]: ("crawl_url", "crawl_category", "crawl_product", "crawl_respect_robots", "crawl_output_format"),
+    VIEWS[1]: ("schema_url", "schema_category", "schema_product", "schema_depth", "schema_max_pages",
+               "catalog_scope", "catalog_depth", "catalog_pages", "catalog_minutes", "catalog_workers"),
+    VIEWS[2]: ("ct_url", "ct_category", "ct_product", "ct_depth", "ct_max_pages",
+               "ct_batch_source", "ct_batch_url", "ct_batch_ids", "ct_batch_workers"),
+    VIEWS[3]: ("similar_url", "similar_category", "similar_product", "similar_search_types"),
+    VIEWS[4]: ("search_query", "search_kind", "search_field", "search_limit"),
+}
+for state_key in (key for view, keys in VIEW_INPUTS.items() if view != active_view for key in keys):
+    if state_key in st.session_state:
+        st.session_state[state_key] = st.session_state[state_key]
+
+# Options shared by every crawl and extraction job
+with st.sidebar:
+    st.subheader("Performance")
+    st.checkbox(
+        "Profile runs with cProfile",
+        key="profile_jobs",
+        help="Adds the slowest functions to each job's performance panel. Profiling slows the run down."
+    )
+    st.checkbox(
+        "Reuse recent results",
+        value=True,
+        key="reuse_results",
+        help="Submitting a URL with the same options as a recently finished job shows that job's result instead of crawling again."
+    )
 
 # Helper function for URL validation
 def is_valid_url(url):
@@ -34,471 +82,792 @@ def is_valid_url(url):
     except:
         return False
 
+# Process-wide job manager shared by every session
+@st.cache_resource
+def get_job_manager():
+    return jobs.JobManager()
+
+# Products by category and brand name, built once per process
+@st.cache_resource
+def product_catalog():
+    return {
+        category: {product["brandName"]: product for product in products}
+        for category, products in GENENTECH_PRODUCTS.items()
+    }
+
+# Category and product selectors; returns the selected product's details
+def product_picker(key):
+    catalog = product_catalog()
+    col1, col2 = st.columns(2)
+    with col1:
+        category = st.selectbox("Select Product Category:", list(catalog.keys()), key=f"{key}_category")
+    with col2:
+        brand_name = st.selectbox("Select Product:", list(catalog.get(category, {}).keys()), key=f"{key}_product")
+    return catalog.get(category, {}).get(brand_name)
+
+# Button callback that fills a URL input; crawls still wait for their own button
+def fill_input(state_key, url):
+    st.session_state[state_key] = url
+
+# Start a background job, or join an identical one that is running or recently finished
+def start_job(state_key, job_key, kind, fn, **params):
+    profile = st.session_state.get("profile_jobs", False)
+    reuse = st.session_state.get("reuse_results", True)
+    try:
+        job = get_job_manager().submit_once((*job_key, profile), kind, fn, profile=profile, reuse=reuse, **params)
+    except jobs.QueueFullError as e:
+        st.error(f"Too many jobs are queued ({e}). Please try again once some have finished.")
+        return None
+    st.session_state[state_key] = job.id
+    return job
+
+# The job this session last started from a view, if it is still retained
+def session_job(state_key):
+    return get_job_manager().get(st.session_state.get(state_key))
+
+# Poll a running job and rerun the page once it has finished
+@st.fragment(run_every=1)
+def show_job_progress(job_id, message):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        st.warning("This job is no longer available. Please start it again.")
+        return
+    if job.done:
+        st.rerun()
+    elapsed = time.time() - (job.started or job.created)
+    pages = (job.progress or {}).get('pages')
+    details = f"{job.status}, {elapsed:.0f}s elapsed" + (f", {pages} pages processed" if pages else "")
+    st.info(f"{message} ({details})")
+
+# Where a finished job spent its time, per stage, host and page
+def show_perf_panel(job, key):
+    recorder = job.perf
+    if recorder is None or not recorder.spans:
+        return
+    summary = recorder.summary()
+    with st.expander("Performance", expanded=False):
+        st.write(f"**{summary['pages']} pages**, {summary['bytes'] / 1024:.0f} KB downloaded in {summary['wallMs'] / 1000:.1f}s")
+        st.write("**By stage**")
+        st.dataframe([dict(stage=stage, **values) for stage, values in summary['stages'].items()], use_container_width=True)
+        for label, groups in (("By host", recorder.by_host()), ("By page", recorder.by_page())):
+            st.write(f"**{label}**")
+            st.dataframe(
+                [{"name": name, "ms": round(sum(values["ms"] for values in stages.values()), 1),
+                  **{stage: round(values["ms"], 1) for stage, values in stages.items()}}
+                 for name, stages in sorted(groups.items(), key=lambda item: -sum(v["ms"] for v in item[1].values()))],
+                use_container_width=True
+            )
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download timings (JSON)", data=recorder.to_json, file_name=f"{key}_perf.json",
+                               mime="application/json", key=f"{key}_perf_json", on_click="ignore")
+        with col2:
+            st.download_button("Download trace (chrome://tracing)", data=recorder.to_trace_events, file_name=f"{key}_trace.json",
+                               mime="application/json", key=f"{key}_perf_trace", on_click="ignore")
+        if recorder.profile:
+            st.write("**cProfile (cumulative)**")
+            st.code(recorder.profile, language=None)
+
+# Link checks are memoised per set of URLs, so reruns do not go back to the network
+@st.cache_data(ttl=link_check.LINK_CHECK_TTL, show_spinner=False)
+def check_links(urls):
+    return link_check.get_checker().check_all(list(urls))
+
+# Check suggested links concurrently and keep only the ones that respond
+def live_links(urls):
+    results = check_links(tuple(urls))
+    alive = [result for result in results.values() if result['alive']]
+    if len(alive) < len(results):
+        st.caption(f"Hid {len(results) - len(alive)} suggested URL(s) that did not respond")
+    return alive
+
+def link_details(result):
+    details = f"HTTP {result['status']} in {result['latencyMs']} ms"
+    if result['finalUrl'] and result['finalUrl'] != result['url']:
+        details += f", redirects to {result['finalUrl']}"
+    return details
+
+# "Use URL" buttons for live suggestions, filling the input at `state_key`
+def suggestion_buttons(urls, state_key):
+    for link in live_links(urls):
+        st.button(f"Use URL: {link['url']}", key=f"{state_key}_{link['url']}", help=link_details(link),
+                  on_click=fill_input, args=(state_key, link['url']))
+
+# Download buttons that only serialise when clicked, as gzip-compressed temp files
+def export_buttons(data, basename, key, formats=("json", "ndjson", "csv"), **options):
+    columns = st.columns(len(formats))
+    for column, fmt in zip(columns, formats):
+        with column:
+            st.download_button(
+                f"Download {fmt.upper()} (gzip)",
+                data=lambda fmt=fmt: exports.export(data, fmt, **options),
+                file_name=exports.filename(basename, fmt),
+                mime=exports.FORMATS[fmt][1],
+                key=f"{key}_{fmt}",
+                on_click="ignore"
+            )
+
+def run_crawl_job(job, url, output_format, respect_robots):
+    result = crawl_website(url, format=output_format, respect_robots=respect_robots)
+    if result and result.get('success'):
+        search_index.get_index().add_page(url, result.get('title'), result.get('content'))
+    return result
+
+def run_schema_job(job, url, depth, max_pages):
+    crawler = WebCrawler()
+    result = crawler.crawl(url, depth=depth, max_pages=max_pages, schema_type="pharma")
+    if result and result.get('combined_schema'):
+        # The prescribing information PDF is the authoritative source for these fields
+        result['packageInsertErrors'] = pi_pdf.enrich_schema(result['combined_schema'])
+        combined_schema = result['combined_schema']
+        search_index.get_index().add_schema("drug", url, combined_schema, product=combined_schema.get('brandName'), title=combined_schema.get('genericName'))
+    return result
+
+# Per-page drug schema for sitemap refreshes; the refresh has just fetched the page, so this is served from the HTTP cache
+def page_schema(page):
+    result = WebCrawler().crawl(page.url, depth=1, max_pages=1, schema_type="pharma")
+    return (result or {}).get('combined_schema') or {}
+
+def run_sitemap_job(job, url, max_pages):
+    result = sitemap.incremental_crawl(url, page_schema, max_pages=max_pages)
+    combined_schema = result['combined_schema']
+    if combined_schema:
+        search_index.get_index().add_schema("drug", url, combined_schema, product=combined_schema.get('brandName'), title=combined_schema.get('genericName'))
+    return result
+
+def run_catalog_job(job, category, depth, max_pages, seconds, workers):
+    products = catalog_batch.products_in(GENENTECH_PRODUCTS, category)
+    def crawl(url, pages):
+        return WebCrawler().crawl(url, depth=depth, max_pages=pages, schema_type="pharma")
+    results = []
+    job.progress = {'products': 0, 'total': len(products), 'results': results}
+    for result in catalog_batch.iter_catalog(products, crawl, max_pages=max_pages, seconds=seconds, workers=workers):
+        results.append(result)
+        job.progress = {'products': len(results), 'total': len(products), 'results': results}
+    return results
+
+# Side-by-side comparison of a catalog batch's schemas, with per-field completeness
+def show_catalog_results(results):
+    matrix = catalog_batch.comparison(results)
+    if matrix:
+        st.dataframe(matrix, use_container_width=True, hide_index=True)
+    failed = [result for result in results if result['error']]
+    if failed:
+        with st.expander(f"Products Without a Schema ({len(failed)})", expanded=False):
+            for result in failed:
+                st.write(f"{result['brandName']}: {result['error']}")
+    return matrix
+
+# Poll a running catalog batch, showing each product's schema as it finishes
+@st.fragment(run_every=2)
+def show_catalog_progress(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        st.warning("This job is no longer available. Please start it again.")
+        return
+    if job.done:
+        st.rerun()
+    progress = job.progress or {}
+    elapsed = time.time() - (job.started or job.created)
+    st.info(f"Generating schemas... ({progress.get('products', 0)} of {progress.get('total', '?')} products, {elapsed:.0f}s elapsed)")
+    show_catalog_results(list(progress.get('results', [])))
+
+# Clinical trial schema structure (shared with the extraction engine)
+CT_SCHEMA = ct_extract.CT_SCHEMA
+
+# Function to extract clinical trial data
+def extract_clinical_trial_data(url, depth=2, max_pages=5, on_page=None, merger=None):
+    # Segment each page once and follow the trial's sub-pages within the page budget
+    return ct_extract.extract_trial(url, depth=depth, max_pages=max_pages, catalog=GENENTECH_PRODUCTS, on_page=on_page, merger=merger)
+
+def run_ct_job(job, url, depth, max_pages):
+    def on_page(page):
+        pages = (job.progress or {}).get('pages', 0) + 1
+        job.progress = {'pages': pages, 'url': page['url']}
+    merger = SchemaMerger(ct_extract.CT_SCHEMA)
+    schema = extract_clinical_trial_data(url, depth=depth, max_pages=max_pages, on_page=on_page, merger=merger)
+    return {'schema': schema, 'provenance': merger.provenance()} if schema else None
+
+def run_ct_batch_job(job, nct_ids, workers):
+    results = []
+    failed = []
+    job.progress = {'trials': 0, 'total': len(nct_ids), 'results': results, 'failed': failed}
+    for nct_id, schema, error in ct_batch.iter_batch(nct_ids, workers=workers, catalog=GENENTECH_PRODUCTS):
+        if schema:
+            if not schema.get('NCTId'):
+                schema['NCTId'] = nct_id
+            results.append(schema)
+        else:
+            failed.append(f"{nct_id}: {error}")
+        job.progress = {'trials': len(results) + len(failed), 'total': len(nct_ids), 'results': results, 'failed': failed}
+    return {'results': results, 'failed': failed, 'total': len(nct_ids)}
+
+# Rows extracted so far, and the trials that failed
+def show_ct_batch_results(results, failed):
+    if results:
+        st.dataframe([ct_batch.flatten(result) for result in results])
+    if failed:
+        with st.expander(f"Failed Trials ({len(failed)})", expanded=False):
+            for failure in failed:
+                st.write(failure)
+
+# Poll a running trial batch, showing each trial's row as it finishes
+@st.fragment(run_every=2)
+def show_ct_batch_progress(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        st.warning("This job is no longer available. Please start it again.")
+        return
+    if job.done:
+        st.rerun()
+    progress = job.progress or {}
+    total = progress.get('total') or 0
+    st.progress(progress.get('trials', 0) / total if total else 0.0)
+    elapsed = time.time() - (job.started or job.created)
+    st.info(f"Extracting trials... ({progress.get('trials', 0)} of {total or '?'} trials, {elapsed:.0f}s elapsed)")
+    show_ct_batch_results(list(progress.get('results', [])), list(progress.get('failed', [])))
+
 # Tab 1: Crawl Website
-with tab1:
+if active_view == VIEWS[0]:
     st.header("Website Crawler")
     st.write("Enter a URL to extract content from any pharmaceutical webpage.")
-    
-    url_input = st.text_input("Enter URL:", placeholder="https://www.example.com/product-page")
-    
+
+    url_input = st.text_input("Enter URL:", placeholder="https://www.example.com/product-page", key="crawl_url")
+
     # Suggest URLs for common Genentech products
     with st.expander("Suggested Genentech Product URLs"):
-        # Create columns for product category selection
-        col1, col2 = st.columns(2)
-        with col1:
-            category = st.selectbox(
-                "Select Product Category:",
-                list(GENENTECH_PRODUCTS.keys())
-            )
-        
-        # Show products based on selected category
-        with col2:
-            filtered_products = [product for product in GENENTECH_PRODUCTS.get(category, [])]
-            product_names = [product["brandName"] for product in filtered_products]
-            
-            selected_product = st.selectbox("Select Product:", product_names)
-            
-            # Get product details
-            selected_product_info = next(
-                (product for product in filtered_products if product["brandName"] == selected_product), 
-                None
-            )
-        
+        selected_product_info = product_picker("crawl")
+
         # Display product info and URL suggestion
         if selected_product_info:
             st.write(f"**Brand Name:** {selected_product_info['brandName']}")
             st.write(f"**Generic Name:** {selected_product_info['genericName']}")
-            
+
             # Generate suggested URLs
-            suggested_urls = [
-                f"https://www.gene.com/medical-professionals/medicines/{selected_product_info['brandName'].lower()}",
-                f"https://www.{selected_product_info['brandName'].lower()}.com",
-                f"https://www.gene.com/patients/medicines/{selected_product_info['brandName'].lower()}"
-            ]
-            
-            for suggested_url in suggested_urls:
-                if st.button(f"Use URL: {suggested_url}", key=f"url_{suggested_url}"):
-                    url_input = suggested_url
-                    st.session_state.url = suggested_url
-    
+            suggestion_buttons(catalog_batch.suggested_urls(selected_product_info), "crawl_url")
+
     # Crawl options
-    respect_robots = st.checkbox("Respect robots.txt", value=True)
-    output_format = st.radio("Output Format:", ["Markdown", "HTML", "Text"])
-    
-    if st.button("Crawl Website", key="crawl_button") or ('url' in st.session_state and st.session_state.url):
-        if url_input or ('url' in st.session_state and st.session_state.url):
-            url_to_crawl = url_input or st.session_state.url
-            
+    respect_robots = st.checkbox("Respect robots.txt", value=True, key="crawl_respect_robots")
+    output_format = st.radio("Output Format:", ["Markdown", "HTML", "Text"], key="crawl_output_format")
+
+    # Crawls only start from the button; other reruns show this session's last crawl
+    if st.button("Crawl Website", key="crawl_button"):
+        if url_input:
             # Store URL in session state for other tabs to use
-            st.session_state.last_crawled_url = url_to_crawl
+            st.session_state.last_crawled_url = url_input
             st.session_state.last_crawled_data = None
-            
-            with st.spinner("Crawling website..."):
-                # Call the crawl function
-                result = crawl_website(url_to_crawl, format=output_format.lower(), respect_robots=respect_robots)
-                
-                # Store result in session state for other tabs to use
-                if result['success']:
-                    st.session_state.last_crawled_data = result
-                
-                if result['success']:
-                    st.success("Website crawled successfully!")
-                    
-                    # Display tabs for different views of the content
-                    content_tab1, content_tab2 = st.tabs(["Formatted Content", "Raw Data"])
-                    
-                    with content_tab1:
-                        st.markdown(result['content'])
-                    
-                    with content_tab2:
-                        st.json(result)
-                    
-                    # Provide download links
-                    hostname = urlparse(url_to_crawl).netloc
-                    st.markdown(get_json_download_link(result, f"{hostname}_content.json"), unsafe_allow_html=True)
-                else:
-                    st.error(f"Failed to crawl website: {result['error']}")
+
+            # Identical crawls from any session share one background job
+            start_job(
+                "crawl_job_id",
+                ("crawl", url_input, output_format.lower(), respect_robots),
+                "crawl",
+                run_crawl_job,
+                url=url_input,
+                output_format=output_format.lower(),
+                respect_robots=respect_robots
+            )
         else:
             st.warning("Please enter a URL")
 
+    job = session_job("crawl_job_id")
+    if job is not None:
+        url_to_crawl = job.params['url']
+        if not job.done:
+            show_job_progress(job.id, "Crawling website...")
+        elif job.status == "failed":
+            st.error(f"Failed to crawl website: {job.error}")
+        else:
+            result = job.result
+            show_perf_panel(job, "crawl")
+
+            # Store result in session state for other tabs to use
+            if result['success']:
+                st.session_state.last_crawled_data = result
+
+            if result['success']:
+                st.success("Website crawled successfully!")
+
+                # Display tabs for different views of the content
+                content_tab1, content_tab2 = st.tabs(["Formatted Content", "Raw Data"])
+
+                with content_tab1:
+                    st.markdown(result['content'])
+
+                with content_tab2:
+                    st.json(result)
+
+                # Provide download links
+                hostname = urlparse(url_to_crawl).netloc
+                export_buttons(result, f"{hostname}_content", "crawl_export")
+            else:
+                st.error(f"Failed to crawl website: {result['error']}")
+
 # Tab 2: Generate Drug Schema
-with tab2:
+if active_view == VIEWS[1]:
     st.header("Drug Schema Generator")
     st.write("Extract structured drug information from any pharmaceutical website.")
-    
+
     # URL input for schema generation
     schema_url = st.text_input("Enter Product URL:", placeholder="https://www.example.com/drug-page", key="schema_url")
-    
+
     # Option to use the last crawled URL from Tab 1
     if 'last_crawled_url' in st.session_state:
-        if st.button(f"Use Last Crawled URL: {st.session_state.last_crawled_url}", key="use_last_url_schema"):
-            schema_url = st.session_state.last_crawled_url
-    
+        st.button(f"Use Last Crawled URL: {st.session_state.last_crawled_url}", key="use_last_url_schema",
+                  on_click=fill_input, args=("schema_url", st.session_state.last_crawled_url))
+
     # Suggested products section
     with st.expander("Suggested Genentech Product URLs"):
-        # Product selection for schema generation
-        schema_col1, schema_col2 = st.columns(2)
-        with schema_col1:
-            schema_category = st.selectbox(
-                "Select Product Category:",
-                list(GENENTECH_PRODUCTS.keys()),
-                key="schema_category"
-            )
-        
-        with schema_col2:
-            # Filter products
-            schema_filtered_products = [product for product in GENENTECH_PRODUCTS.get(schema_category, [])]
-            schema_product_names = [product["brandName"] for product in schema_filtered_products]
-            
-            schema_selected_product = st.selectbox("Select Product:", schema_product_names, key="schema_product")
-            
-            # Get product details
-            schema_selected_product_info = next(
-                (product for product in schema_filtered_products if product["brandName"] == schema_selected_product), 
-                None
-            )
-        
+        schema_selected_product_info = product_picker("schema")
+
         # Display product info and URL suggestions for schema generation
         if schema_selected_product_info:
             # Generate suggested URLs
-            schema_suggested_urls = [
-                f"https://www.gene.com/medical-professionals/medicines/{schema_selected_product_info['brandName'].lower()}",
-                f"https://www.{schema_selected_product_info['brandName'].lower()}.com",
-                f"https://www.gene.com/patients/medicines/{schema_selected_product_info['brandName'].lower()}"
-            ]
-            
-            for suggested_url in schema_suggested_urls:
-                if st.button(f"Use URL: {suggested_url}", key=f"schema_url_{suggested_url}"):
-                    schema_url = suggested_url
-                    st.session_state.schema_url = suggested_url
-    
+            suggestion_buttons(catalog_batch.suggested_urls(schema_selected_product_info), "schema_url")
+
     # Crawl depth and page limit
     schema_col3, schema_col4 = st.columns(2)
     with schema_col3:
-        crawl_depth = st.slider("Crawl Depth:", min_value=1, max_value=5, value=2)
+        crawl_depth = st.slider("Crawl Depth:", min_value=1, max_value=5, value=2, key="schema_depth")
     with schema_col4:
-        max_pages = st.slider("Max Pages:", min_value=1, max_value=20, value=10)
-    
-    if st.button("Generate Drug Schema", key="generate_schema") or ('schema_url' in st.session_state and st.session_state.schema_url):
-        url_to_use = schema_url or (st.session_state.schema_url if 'schema_url' in st.session_state else None)
-        
-        if url_to_use:
-            with st.spinner("Generating schema... This may take a few minutes depending on the website size and crawl settings."):
-                # Initialize the crawler and crawl the website
-                crawler = WebCrawler()
-                schema_result = crawler.crawl(url_to_use, depth=crawl_depth, max_pages=max_pages, schema_type="pharma")
-                
-                # Store for other tabs
-                st.session_state.last_schema_result = schema_result
-                
-                if schema_result:
-                    st.success("Schema generated successfully!")
-                    
-                    # Display the combined schema
-                    st.subheader("Combined Drug Schema")
-                    combined_schema = schema_result['combined_schema']
-                    
-                    # Create a more user-friendly display
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.write("**Basic Information:**")
-                        st.write(f"Brand Name: {combined_schema.get('brandName', 'Not found')}")
-                        st.write(f"Generic Name: {combined_schema.get('genericName', 'Not found')}")
-                        st.write(f"Manufacturer: {combined_schema.get('manufacturer', 'Not found')}")
-                        st.write(f"Drug Class: {combined_schema.get('drugClass', 'Not found')}")
-                        
-                        st.write("**Dosage & Administration:**")
-                        st.write(f"Dosage Forms: {', '.join(combined_schema.get('dosageForm', ['Not found']))}")
-                        st.write("Administration:")
-                        st.write(combined_schema.get('administration', 'Not found'))
-                    
-                    with col2:
-                        st.write("**Mechanism & Approval:**")
-                        st.write("Mechanism of Action:")
-                        st.write(combined_schema.get('mechanismOfAction', 'Not found'))
-                        st.write(f"Approval Date: {combined_schema.get('approvalDate', 'Not found')}")
-                        
-                        st.write("**Resources:**")
-                        st.write(f"Package Insert URL: {combined_schema.get('packageInsertURL', 'Not found')}")
-                    
-                    # Expandable sections for longer lists
-                    with st.expander("Approved Indications", expanded=False):
-                        indications = combined_schema.get('approvedIndications', [])
-                        if indications:
-                            for idx, indication in enumerate(indications, 1):
-                                st.write(f"{idx}. {indication}")
-                        else:
-                            st.write("No indications found")
-                    
-                    with st.expander("Side Effects", expanded=False):
-                        side_effects = combined_schema.get('sideEffects', [])
-                        if side_effects:
-                            for idx, effect in enumerate(side_effects, 1):
-                                st.write(f"{idx}. {effect}")
-                        else:
-                            st.write("No side effects found")
-                    
-                    with st.expander("Warnings", expanded=False):
-                        warnings = combined_schema.get('warnings', [])
-                        if warnings:
-                            for idx, warning in enumerate(warnings, 1):
-                                st.write(f"{idx}. {warning}")
-                        else:
-                            st.write("No warnings found")
-                    
-                    with st.expander("Clinical Trials", expanded=False):
-                        trials = combined_schema.get('clinicalTrials', [])
-                        if trials:
-                            for idx, trial in enumerate(trials, 1):
-                                st.write(f"{idx}. {trial}")
-                        else:
-                            st.write("No clinical trials found")
-                    
-                    with st.expander("Patient Resources", expanded=False):
-                        resources = combined_schema.get('patientResources', [])
-                        if resources:
-                            for idx, resource in enumerate(resources, 1):
-                                st.write(f"{idx}. {resource}")
-                        else:
-                            st.write("No patient resources found")
-                    
-                    # Raw data view
-                    with st.expander("Raw Schema Data", expanded=False):
-                        st.json(combined_schema)
-                    
-                    # Provide download links
-                    product_name = combined_schema.get('brandName', 'product')
-                    st.markdown(get_json_download_link(combined_schema, f"{product_name}_schema.json"), unsafe_allow_html=True)
-                    
-                else:
-                    st.error("Failed to generate schema. Please check the URL and try again.")
+        max_pages = st.slider("Max Pages:", min_value=1, max_value=200, value=10, key="schema_max_pages")
+
+    if st.button("Generate Drug Schema", key="generate_schema"):
+        if schema_url:
+            # Identical schema crawls from any session share one background job
+            start_job(
+                "schema_job_id",
+                ("schema", schema_url, crawl_depth, max_pages),
+                "schema",
+                run_schema_job,
+                url=schema_url,
+                depth=crawl_depth,
+                max_pages=max_pages
+            )
+        else:
+            st.warning("Please enter a product URL")
+
+    # Re-fetch only the pages whose sitemap lastmod or content changed since the last refresh
+    if st.button("Refresh From Sitemap", key="refresh_schema", help="Reads the site's sitemaps and re-extracts only new or changed pages, up to Max Pages"):
+        if schema_url:
+            start_job(
+                "sitemap_job_id",
+                ("sitemap", schema_url, max_pages),
+                "sitemap",
+                run_sitemap_job,
+                url=schema_url,
+                max_pages=max_pages
+            )
         else:
             st.warning("Please enter a product URL")
 
+    job = session_job("sitemap_job_id")
+    if job is not None:
+        if not job.done:
+            show_job_progress(job.id, "Refreshing schema from the site's sitemaps...")
+        elif job.status == "failed":
+            st.error(f"Sitemap refresh failed: {job.error}")
+        else:
+            report = job.result['pages']
+            st.success(", ".join(f"{len(urls)} {bucket}" for bucket, urls in report.items()))
+            if job.result['diff']:
+                st.write("**Changed Fields Since the Last Refresh:**")
+                st.json(job.result['diff'])
+            else:
+                st.info("No fields changed since the last refresh")
+            with st.expander("Combined Drug Schema", expanded=False):
+                st.json(job.result['combined_schema'])
+            show_perf_panel(job, "sitemap")
+            export_buttons(job.result['combined_schema'], "drug_schema_refresh", "sitemap_export", formats=("json",))
+
+    job = session_job("schema_job_id")
+    if job is not None:
+        if not job.done:
+            show_job_progress(job.id, "Generating schema... This may take a few minutes depending on the website size and crawl settings.")
+        elif job.status == "failed":
+            st.error(f"Failed to generate schema: {job.error}")
+        else:
+            schema_result = job.result
+            show_perf_panel(job, "schema")
+
+            # Store for other tabs
+            st.session_state.last_schema_result = schema_result
+
+            if schema_result:
+                st.success("Schema generated successfully!")
+
+                # Display the combined schema
+                st.subheader("Combined Drug Schema")
+                combined_schema = schema_result['combined_schema']
+
+                # Create a more user-friendly display
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.write("**Basic Information:**")
+                    st.write(f"Brand Name: {combined_schema.get('brandName', 'Not found')}")
+                    st.write(f"Generic Name: {combined_schema.get('genericName', 'Not found')}")
+                    st.write(f"Manufacturer: {combined_schema.get('manufacturer', 'Not found')}")
+                    st.write(f"Drug Class: {combined_schema.get('drugClass', 'Not found')}")
+
+                    st.write("**Dosage & Administration:**")
+                    st.write(f"Dosage Forms: {', '.join(combined_schema.get('dosageForm', ['Not found']))}")
+                    st.write("Administration:")
+                    st.write(combined_schema.get('administration', 'Not found'))
+
+                with col2:
+                    st.write("**Mechanism & Approval:**")
+                    st.write("Mechanism of Action:")
+                    st.write(combined_schema.get('mechanismOfAction', 'Not found'))
+                    st.write(f"Approval Date: {combined_schema.get('approvalDate', 'Not found')}")
+
+                    st.write("**Resources:**")
+                    st.write(f"Package Insert URL: {combined_schema.get('packageInsertURL', 'Not found')}")
+                    for failed_url in schema_result.get('packageInsertErrors', []):
+                        st.warning(f"Could not read package insert: {failed_url}")
+
+                # Expandable sections for longer lists
+                with st.expander("Approved Indications", expanded=False):
+                    indications = combined_schema.get('approvedIndications', [])
+                    if indications:
+                        for idx, indication in enumerate(indications, 1):
+                            st.write(f"{idx}. {indication}")
+                    else:
+                        st.write("No indications found")
+
+                with st.expander("Side Effects", expanded=False):
+                    side_effects = combined_schema.get('sideEffects', [])
+                    if side_effects:
+                        for idx, effect in enumerate(side_effects, 1):
+                            st.write(f"{idx}. {effect}")
+                    else:
+                        st.write("No side effects found")
+
+                with st.expander("Warnings", expanded=False):
+                    warnings = combined_schema.get('warnings', [])
+                    if warnings:
+                        for idx, warning in enumerate(warnings, 1):
+                            st.write(f"{idx}. {warning}")
+                    else:
+                        st.write("No warnings found")
+
+                with st.expander("Clinical Trials", expanded=False):
+                    trials = combined_schema.get('clinicalTrials', [])
+                    if trials:
+                        for idx, trial in enumerate(trials, 1):
+                            st.write(f"{idx}. {trial}")
+                    else:
+                        st.write("No clinical trials found")
+
+                with st.expander("Patient Resources", expanded=False):
+                    resources = combined_schema.get('patientResources', [])
+                    if resources:
+                        for idx, resource in enumerate(resources, 1):
+                            st.write(f"{idx}. {resource}")
+                    else:
+                        st.write("No patient resources found")
+
+                # Raw data view
+                with st.expander("Raw Schema Data", expanded=False):
+                    st.json(combined_schema)
+
+                # Provide download links
+                product_name = combined_schema.get('brandName', 'product')
+                export_buttons(combined_schema, f"{product_name}_schema", "schema_export")
+
+            else:
+                st.error("Failed to generate schema. Please check the URL and try again.")
+
+    # Batch mode: every product in a category, or the whole catalog, under one budget
+    with st.expander("Batch Mode: Whole Catalog"):
+        catalog_scope = st.selectbox("Products:", ["All categories"] + list(product_catalog().keys()), key="catalog_scope")
+        catalog_category = None if catalog_scope == "All categories" else catalog_scope
+        catalog_col1, catalog_col2 = st.columns(2)
+        with catalog_col1:
+            catalog_depth = st.slider("Crawl Depth:", min_value=1, max_value=5, value=2, key="catalog_depth")
+            catalog_pages = st.number_input("Total Page Budget:", min_value=1, max_value=20000, value=catalog_batch.CATALOG_MAX_PAGES, key="catalog_pages")
+        with catalog_col2:
+            catalog_minutes = st.number_input("Time Budget (minutes):", min_value=1, max_value=600, value=max(1, catalog_batch.CATALOG_TIME_BUDGET // 60), key="catalog_minutes")
+            catalog_workers = st.slider("Products in Parallel:", min_value=1, max_value=16, value=catalog_batch.CATALOG_WORKERS, key="catalog_workers")
+        catalog_count = len(catalog_batch.products_in(GENENTECH_PRODUCTS, catalog_category))
+        st.caption(f"{catalog_count} products, about {max(int(catalog_pages) // max(catalog_count, 1), 1)} pages each; products with no live URL are left out of the split")
+        if int(catalog_pages) < catalog_count:
+            st.warning(f"The page budget covers only {int(catalog_pages)} of {catalog_count} products; the rest will report an exhausted budget")
+
+        if st.button("Run Catalog Batch", key="catalog_run"):
+            # Identical batches from any session share one background job
+            start_job(
+                "catalog_job_id",
+                ("catalog", catalog_category, catalog_depth, int(catalog_pages), int(catalog_minutes), catalog_workers),
+                "catalog",
+                run_catalog_job,
+                category=catalog_category,
+                depth=catalog_depth,
+                max_pages=int(catalog_pages),
+                seconds=int(catalog_minutes) * 60,
+                workers=catalog_workers
+            )
+
+        job = session_job("catalog_job_id")
+        if job is not None:
+            if not job.done:
+                show_catalog_progress(job.id)
+            elif job.status == "failed":
+                st.error(f"Catalog batch failed: {job.error}")
+            else:
+                schemas = [result for result in job.result if result['schema']]
+                st.success(f"Generated {len(schemas)} of {len(job.result)} product schemas")
+                matrix = show_catalog_results(job.result)
+                show_perf_panel(job, "catalog")
+                if matrix:
+                    export_buttons(matrix, "catalog_comparison", "catalog_matrix_export", formats=("csv",))
+                    export_buttons([result['schema'] for result in schemas], "catalog_schemas", "catalog_schema_export", formats=("json", "ndjson"))
+
 # Tab 3: Generate Clinical Trial Schema
-with tab3:
+if active_view == VIEWS[2]:
     st.header("Clinical Trial Schema Generator")
     st.write("Extract structured clinical trial information from any pharmaceutical clinical trial page.")
-    
+
     # URL input for clinical trial schema
     ct_url = st.text_input("Enter Clinical Trial URL:", placeholder="https://clinicaltrials.gov/study/...", key="ct_url")
-    
+
     # Option to use the last crawled URL
     if 'last_crawled_url' in st.session_state:
-        if st.button(f"Use Last Crawled URL: {st.session_state.last_crawled_url}", key="use_last_url_ct"):
-            ct_url = st.session_state.last_crawled_url
-    
+        st.button(f"Use Last Crawled URL: {st.session_state.last_crawled_url}", key="use_last_url_ct",
+                  on_click=fill_input, args=("ct_url", st.session_state.last_crawled_url))
+
     # Suggested clinical trial URLs
     with st.expander("Find Clinical Trial URLs"):
-        # Product selection for clinical trials
-        ct_col1, ct_col2 = st.columns(2)
-        with ct_col1:
-            ct_category = st.selectbox(
-                "Select Product Category:",
-                list(GENENTECH_PRODUCTS.keys()),
-                key="ct_category"
-            )
-        
-        with ct_col2:
-            # Filter products
-            ct_filtered_products = [product for product in GENENTECH_PRODUCTS.get(ct_category, [])]
-            ct_product_names = [product["brandName"] for product in ct_filtered_products]
-            
-            ct_selected_product = st.selectbox("Select Product:", ct_product_names, key="ct_product")
-            
-            # Get product details
-            ct_selected_product_info = next(
-                (product for product in ct_filtered_products if product["brandName"] == ct_selected_product), 
-                None
-            )
-        
+        ct_selected_product_info = product_picker("ct")
+
         # Display clinical trial search options
         if ct_selected_product_info:
             st.write(f"**Selected Product:** {ct_selected_product_info['brandName']} ({ct_selected_product_info['genericName']})")
-            
+
             # Generate suggested URLs for clinical trials
             ct_suggested_urls = [
                 f"https://clinicaltrials.gov/search?cond=&term={ct_selected_product_info['genericName'].replace(' ', '+')}&type=&rslt=&recrs=&age_v=&gndr=&intr=&titles=&outc=&spons=Genentech&lead=&id=&cntry=&state=&city=&dist=&locn=&phase=&rsub=&strd_s=&strd_e=&prcd_s=&prcd_e=&sfpd_s=&sfpd_e=&rfpd_s=&rfpd_e=&lupd_s=&lupd_e=&sort=",
                 f"https://www.gene.com/medical-professionals/clinical-trials?Medicine={ct_selected_product_info['brandName'].lower()}"
             ]
-            
-            for suggested_url in ct_suggested_urls:
-                if st.button(f"Use URL: {suggested_url}", key=f"ct_url_{suggested_url}"):
-                    ct_url = suggested_url
-                    st.session_state.ct_url = suggested_url
-    
+            suggestion_buttons(ct_suggested_urls, "ct_url")
+
     # Clinical trial schema options
     ct_col3, ct_col4 = st.columns(2)
     with ct_col3:
         ct_crawl_depth = st.slider("Crawl Depth:", min_value=1, max_value=3, value=2, key="ct_depth")
     with ct_col4:
         ct_max_pages = st.slider("Max Pages:", min_value=1, max_value=10, value=5, key="ct_max_pages")
-    
-    # Define a clinical trial schema structure
-    CT_SCHEMA = {
-        "productName": None,
-        "genericName": None,
-        "studyType": None,
-        "phase": None,
-        "conditions": [],
-        "interventions": [],
-        "primaryOutcomes": [],
-        "secondaryOutcomes": [],
-        "eligibilityCriteria": {
-            "inclusion": [],
-            "exclusion": []
-        },
-        "enrollmentCount": None,
-        "studyStart": None,
-        "studyCompletion": None,
-        "locations": [],
-        "sponsor": None,
-        "NCTId": None,
-        "status": None
-    }
-    
-    # Function to extract clinical trial data
-    def extract_clinical_trial_data(url, depth=2, max_pages=5):
-        try:
-            # First do a basic crawl of the URL
-            result = crawl_website(url)
-            
-            if not result['success']:
-                return None
-                
-            # Initialize a CT schema
-            ct_schema = CT_SCHEMA.copy()
-            
-            # Extract basic information from the crawled content
-            content = result.get('content', '')
-            
-            # Extract NCT ID (clinical trials ID format)
-            nct_match = re.search(r'NCT\d{8}', content)
-            if nct_match:
-                ct_schema['NCTId'] = nct_match.group(0)
-            
-            # Extract phase information
-            phase_match = re.search(r'Phase (?:I{1,3}|[1-4]|I{1,3}/I{1,3}|[1-4]/[1-4])', content)
-            if phase_match:
-                ct_schema['phase'] = phase_match.group(0)
-            
-            # Extract status
-            for status in ['Recruiting', 'Active, not recruiting', 'Completed', 'Withdrawn', 'Terminated', 'Not yet recruiting']:
-                if status in content:
-                    ct_schema['status'] = status
-                    break
-            
-            # Extract enrollment count
-            enrollment_match = re.search(r'(?:Enrollment|Participants):\s*(\d+)', content)
-            if enrollment_match:
-                ct_schema['enrollmentCount'] = enrollment_match.group(1)
-            
-            # Extract study dates
-            start_match = re.search(r'(?:Start Date|Study Start):\s*([A-Za-z]+ \d{1,2}, \d{4}|\d{1,2} [A-Za-z]+ \d{4}|\d{4}-\d{2}-\d{2})', content)
-            if start_match:
-                ct_schema['studyStart'] = start_match.group(1)
-                
-            completion_match = re.search(r'(?:Completion Date|Study Completion):\s*([A-Za-z]+ \d{1,2}, \d{4}|\d{1,2} [A-Za-z]+ \d{4}|\d{4}-\d{2}-\d{2})', content)
-            if completion_match:
-                ct_schema['studyCompletion'] = completion_match.group(1)
-            
-            # Extract sponsor
-            sponsor_match = re.search(r'(?:Sponsor|Responsible Party):\s*([^,;\n\r]+)', content)
-            if sponsor_match:
-                ct_schema['sponsor'] = sponsor_match.group(1).strip()
-                
-            # Extract conditions
-            conditions_section = re.search(r'(?:Condition|Disease)s?:([^:]+?)(?:Intervention|Sponsor|Outcome)', content)
-            if conditions_section:
-                condition_text = conditions_section.group(1)
-                conditions = [c.strip() for c in re.split(r',|\n', condition_text) if c.strip()]
-                ct_schema['conditions'] = conditions
-            
-            # For ClinicalTrials.gov URLs, try to extract if a Genentech product is being studied
-            if 'clinicaltrials.gov' in url.lower():
-                # Check all Genentech products
-                for category, products in GENENTECH_PRODUCTS.items():
-                    for product in products:
-                        if product['brandName'].lower() in content.lower() or product['genericName'].lower() in content.lower():
-                            ct_schema['productName'] = product['brandName']
-                            ct_schema['genericName'] = product['genericName']
-                            break
-            
-            # Extract primary outcomes
-            outcomes_section = re.search(r'Primary (?:Outcome|Endpoint|Measure)[^:]*:([^:]+?)(?:Secondary|Sponsor|Eligibility)', content)
-            if outcomes_section:
-                outcome_text = outcomes_section.group(1)
-                outcomes = [o.strip() for o in re.split(r'\n\s*-|\n\d+\.|\n\s*•', outcome_text) if o.strip()]
-                ct_schema['primaryOutcomes'] = outcomes
-            
-            return ct_schema
-            
-        except Exception as e:
-            st.error(f"Error extracting clinical trial data: {str(e)}")
-            return None
-    
-    if st.button("Generate Clinical Trial Schema", key="generate_ct_schema") or ('ct_url' in st.session_state and st.session_state.ct_url):
-        url_to_use = ct_url or (st.session_state.ct_url if 'ct_url' in st.session_state else None)
-        
-        if url_to_use:
-            with st.spinner("Extracting clinical trial data..."):
-                # Extract clinical trial information
-                ct_schema = extract_clinical_trial_data(url_to_use, depth=ct_crawl_depth, max_pages=ct_max_pages)
-                
-                if ct_schema:
-                    st.success("Clinical trial information extracted!")
-                    
-                    # Display the schema in a readable format
-                    st.subheader("Clinical Trial Information")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write("**Basic Information:**")
-                        st.write(f"NCT ID: {ct_schema.get('NCTId', 'Not found')}")
-                        st.write(f"Product: {ct_schema.get('productName', 'Not specified')}")
-                        st.write(f"Generic Name: {ct_schema.get('genericName', 'Not specified')}")
-                        st.write(f"Phase: {ct_schema.get('phase', 'Not specified')}")
-                        st.write(f"Status: {ct_schema.get('status', 'Not specified')}")
-                    
-                    with col2:
-                        st.write("**Timeline Information:**")
-                        st.write(f"Enrollment: {ct_schema.get('enrollmentCount', 'Not specified')} participants")
-                        st.write(f"Study Start: {ct_schema.get('studyStart', 'Not specified')}")
-                        st.write(f"Study Completion: {ct_schema.get('studyCompletion', 'Not specified')}")
-                        st.write(f"Sponsor: {ct_schema.get('sponsor', 'Not specified')}")
-                    
-                    # Expandable sections
-                    with st.expander("Conditions", expanded=False):
-                        conditions = ct_schema.get('conditions', [])
-                        if conditions:
-                            for idx, condition in enumerate(conditions, 1):
-                                st.write(f"{idx}. {condition}")
-                        else:
-                            st.write("No conditions specified")
-                    
-                    with st.expander("Primary Outcomes", expanded=False):
-                        outcomes = ct_schema.get('primaryOutcomes', [])
-                        if outcomes:
-                            for idx, outcome in enumerate(outcomes, 1):
-                                st.write(f"{idx}. {outcome}")
-                        else:
-                            st.write("No primary outcomes specified")
-                    
-                    # Raw data view
-                    with st.expander("Raw Clinical Trial Data", expanded=False):
-                        st.json(ct_schema)
-                    
-                    # Provide download link
-                    filename = f"clinical_trial_{ct_schema.get('NCTId', 'data')}.json"
-                    st.markdown(get_json_download_link(ct_schema, filename), unsafe_allow_html=True)
-                else:
-                    st.error("Failed to extract clinical trial data. Please check the URL and try again.")
+
+    if st.button("Generate Clinical Trial Schema", key="generate_ct_schema"):
+        if ct_url:
+            # Identical extractions from any session share one background job
+            start_job(
+                "ct_job_id",
+                ("clinical_trial", ct_url, ct_crawl_depth, ct_max_pages),
+                "clinical_trial",
+                run_ct_job,
+                url=ct_url,
+                depth=ct_crawl_depth,
+                max_pages=ct_max_pages
+            )
         else:
             st.warning("Please enter a clinical trial URL")
 
+    job = session_job("ct_job_id")
+    if job is not None:
+        if not job.done:
+            show_job_progress(job.id, "Extracting clinical trial data...")
+        elif job.status == "failed":
+            st.error(f"Error extracting clinical trial data: {job.error}")
+        else:
+            ct_schema = job.result['schema'] if job.result else None
+            show_perf_panel(job, "ct")
+
+            if ct_schema:
+                st.success("Clinical trial information extracted!")
+
+                # Display the schema in a readable format
+                st.subheader("Clinical Trial Information")
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.write("**Basic Information:**")
+                    st.write(f"NCT ID: {ct_schema.get('NCTId', 'Not found')}")
+                    st.write(f"Product: {ct_schema.get('productName', 'Not specified')}")
+                    st.write(f"Generic Name: {ct_schema.get('genericName', 'Not specified')}")
+                    st.write(f"Phase: {ct_schema.get('phase', 'Not specified')}")
+                    st.write(f"Status: {ct_schema.get('status', 'Not specified')}")
+
+                with col2:
+                    st.write("**Timeline Information:**")
+                    st.write(f"Enrollment: {ct_schema.get('enrollmentCount', 'Not specified')} participants")
+                    st.write(f"Study Start: {ct_schema.get('studyStart', 'Not specified')}")
+                    st.write(f"Study Completion: {ct_schema.get('studyCompletion', 'Not specified')}")
+                    st.write(f"Sponsor: {ct_schema.get('sponsor', 'Not specified')}")
+
+                # Expandable sections
+                with st.expander("Conditions", expanded=False):
+                    conditions = ct_schema.get('conditions', [])
+                    if conditions:
+                        for idx, condition in enumerate(conditions, 1):
+                            st.write(f"{idx}. {condition}")
+                    else:
+                        st.write("No conditions specified")
+
+                with st.expander("Primary Outcomes", expanded=False):
+                    outcomes = ct_schema.get('primaryOutcomes', [])
+                    if outcomes:
+                        for idx, outcome in enumerate(outcomes, 1):
+                            st.write(f"{idx}. {outcome}")
+                    else:
+                        st.write("No primary outcomes specified")
+
+                with st.expander("Interventions", expanded=False):
+                    interventions = ct_schema.get('interventions', [])
+                    if interventions:
+                        for idx, intervention in enumerate(interventions, 1):
+                            st.write(f"{idx}. {intervention}")
+                    else:
+                        st.write("No interventions specified")
+
+                with st.expander("Secondary Outcomes", expanded=False):
+                    outcomes = ct_schema.get('secondaryOutcomes', [])
+                    if outcomes:
+                        for idx, outcome in enumerate(outcomes, 1):
+                            st.write(f"{idx}. {outcome}")
+                    else:
+                        st.write("No secondary outcomes specified")
+
+                with st.expander("Eligibility Criteria", expanded=False):
+                    eligibility = ct_schema.get('eligibilityCriteria', {})
+                    st.write("**Inclusion:**")
+                    for idx, criterion in enumerate(eligibility.get('inclusion', []), 1):
+                        st.write(f"{idx}. {criterion}")
+                    st.write("**Exclusion:**")
+                    for idx, criterion in enumerate(eligibility.get('exclusion', []), 1):
+                        st.write(f"{idx}. {criterion}")
+
+                with st.expander("Locations", expanded=False):
+                    locations = ct_schema.get('locations', [])
+                    if locations:
+                        for idx, location in enumerate(locations, 1):
+                            st.write(f"{idx}. {location}")
+                    else:
+                        st.write("No locations specified")
+
+                # Raw data view
+                with st.expander("Raw Clinical Trial Data", expanded=False):
+                    st.json(ct_schema)
+
+                # Where each value came from, for review
+                with st.expander("Value Sources", expanded=False):
+                    for field, values in job.result['provenance'].items():
+                        if isinstance(values, dict):
+                            for subfield, subvalues in values.items():
+                                for entry in subvalues:
+                                    st.write(f"**{field}.{subfield}:** {entry['value']} ({entry['count']}x, {', '.join(entry['sources'])})")
+                        else:
+                            for entry in values:
+                                st.write(f"**{field}:** {entry['value']} ({entry['count']}x, {', '.join(entry['sources'])})")
+
+                # Provide download link
+                export_buttons(ct_schema, f"clinical_trial_{ct_schema.get('NCTId', 'data')}", "ct_export", row=ct_batch.flatten)
+            else:
+                st.error("Failed to extract clinical trial data. Please check the URL and try again.")
+
+    # Batch mode: extract many trials into one table
+    with st.expander("Batch Mode: Extract Multiple Trials"):
+        batch_source = st.radio(
+            "Trial source:",
+            ["Search results URL", "NCT ID list", "CSV upload"],
+            key="ct_batch_source"
+        )
+
+        batch_input = None
+        if batch_source == "Search results URL":
+            batch_input = st.text_input("Enter search results URL:", placeholder="https://clinicaltrials.gov/search?term=...", key="ct_batch_url")
+        elif batch_source == "NCT ID list":
+            batch_input = st.text_area("Paste NCT IDs:", placeholder="NCT01234567, NCT07654321", key="ct_batch_ids")
+        else:
+            batch_input = st.file_uploader("Upload CSV with NCT IDs:", type=["csv"], key="ct_batch_csv")
+
+        batch_workers = st.slider("Parallel Workers:", min_value=1, max_value=32, value=ct_batch.BATCH_WORKERS, key="ct_batch_workers")
+
+        if st.button("Run Batch Extraction", key="ct_batch_run"):
+            if not batch_input:
+                st.warning("Please provide trials to extract")
+            else:
+                # Collect the NCT IDs to extract
+                nct_ids = None
+                if batch_source == "Search results URL":
+                    try:
+                        nct_ids = ct_batch.nct_ids_from_search(batch_input)
+                    except (requests.RequestException, ValueError) as e:
+                        st.error(f"Failed to read search results: {e}")
+                elif batch_source == "NCT ID list":
+                    nct_ids = ct_batch.nct_ids_from_text(batch_input)
+                else:
+                    nct_ids = ct_batch.nct_ids_from_csv(batch_input)
+
+                if not nct_ids:
+                    # None means the search failed and the error is already shown
+                    if nct_ids is not None:
+                        st.warning("No NCT IDs found")
+                else:
+                    # Runs in the background, so reruns and view switches do not wait for it
+                    start_job(
+                        "ct_batch_job_id",
+                        ("ct_batch", tuple(nct_ids), batch_workers),
+                        "ct_batch",
+                        run_ct_batch_job,
+                        nct_ids=nct_ids,
+                        workers=batch_workers
+                    )
+
+        job = session_job("ct_batch_job_id")
+        if job is not None:
+            if not job.done:
+                show_ct_batch_progress(job.id)
+            elif job.status == "failed":
+                st.error(f"Batch extraction failed: {job.error}")
+            else:
+                st.success(f"Extracted {len(job.result['results'])} of {job.result['total']} trials")
+                show_ct_batch_results(job.result['results'], job.result['failed'])
+                show_perf_panel(job, "ct_batch")
+                # Export the latest batch
+                if job.result['results']:
+                    export_buttons(job.result['results'], "clinical_trials", "ct_batch_export", formats=("csv", "ndjson"), row=ct_batch.flatten)
+
+# Tab 5: Search Past Crawls
+if active_view == VIEWS[4]:
+    st.header("Search Past Crawls")
+    st.write("Search every page, drug schema and clinical trial schema crawled so far, without crawling again.")
+
+    index = search_index.get_index()
+    counts = index.stats()
+    st.caption(f"Indexed: {counts['page']} pages, {counts['drug']} drug schemas, {counts['trial']} clinical trial schemas")
+
+    search_query = st.text_input("Search:", placeholder="hepatotoxicity", key="search_query")
+    search_col1, search_col2, search_col3 = st.columns(3)
+    with search_col1:
+        kind_labels = {"All": None, "Pages": "page", "Drug Schemas": "drug", "Clinical Trial Schemas": "trial"}
+        search_kind = kind_labels[st.selectbox("Search In:", list(kind_labels.keys()), key="search_kind")]
+    with search_col2:
+        search_field = st.selectbox("Field:", ["Any"] + index.fields(search_kind), key="search_field")
+    with search_col3:
+        search_limit = st.slider("Max Results:", min_value=5, max_value=100, value=20, key="search_limit")
+
+    if search_query:
+        start = time.perf_counter()
+        hits = index.search(search_query, kind=search_kind, field=None if search_field == "Any" else search_field, limit=search_limit)
+        st.caption(f"{len(hits)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for hit in hits:
+            label = hit['product'] or hit['title'] or hit['url']
+            st.markdown(f"**{label}** · {hit['kind']} · `{hit['field']}`  \n{hit['url']}")
+            st.markdown(f"> {hit['snippet']}")
+
 # Tab 4: Find Similar Sites
-with tab4:
+if active_view == VIEWS[3]:
     st.header("Find Similar Sites")
     st.write("Discover related websites and resources based on a URL.")
     
@@ -507,8 +876,8 @@ with tab4:
     
     # Option to use the last crawled URL
     if 'last_crawled_url' in st.session_state:
-        if st.button(f"Use Last Crawled URL: {st.session_state.last_crawled_url}", key="use_last_url_similar"):
-            similar_url = st.session_state.last_crawled_url
+        st.button(f"Use Last Crawled URL: {st.session_state.last_crawled_url}", key="use_last_url_similar",
+                  on_click=fill_input, args=("similar_url", st.session_state.last_crawled_url))
     
     # Option to use last schema product
     if 'last_schema_result' in st.session_state:
@@ -521,27 +890,7 @@ with tab4:
     
     # Or manually select a product
     with st.expander("Select a Specific Product"):
-        # Product selection
-        similar_col1, similar_col2 = st.columns(2)
-        with similar_col1:
-            similar_category = st.selectbox(
-                "Select Product Category:",
-                list(GENENTECH_PRODUCTS.keys()),
-                key="similar_category"
-            )
-        
-        with similar_col2:
-            # Filter products
-            similar_filtered_products = [product for product in GENENTECH_PRODUCTS.get(similar_category, [])]
-            similar_product_names = [product["brandName"] for product in similar_filtered_products]
-            
-            similar_selected_product = st.selectbox("Select Product:", similar_product_names, key="similar_product")
-            
-            # Get product details
-            similar_selected_product_info = next(
-                (product for product in similar_filtered_products if product["brandName"] == similar_selected_product), 
-                None
-            )
+        similar_selected_product_info = product_picker("similar")
         
         # Display product info
         if similar_selected_product_info:
@@ -563,74 +912,82 @@ with tab4:
             "Competitive products",
             "Scientific publications"
         ],
-        default=["Official product websites", "Healthcare professional resources", "Patient resources"]
+        default=["Official product websites", "Healthcare professional resources", "Patient resources"],
+        key="similar_search_types"
     )
     
-    # Function to find similar sites based on URL or product info
+    # Function to find similar sites based on URL or product info, memoised per URL, product and site types
+    @st.cache_data(ttl=link_check.LINK_CHECK_TTL, show_spinner="Finding similar sites...")
     def find_similar_sites(url=None, product_name=None, generic_name=None, search_types=None):
         similar_sites = {}
+        index = similarity.get_similarity_index()
+        matches = []
         
         # Case 1: We have a URL but no product info
         if url and not product_name:
-            # Try to extract product name from URL or content
+            # Pages we have crawled are compared directly; anything else is fetched once
             try:
-                # Basic crawl to get content
-                result = crawl_website(url)
+                page = ParsedPage.from_response(url, http_cache.cached_get(url))
+                matches = index.similar_to_url(url, k=100) or [
+                    match for match in index.similar_to_text(page.text, k=100) if match[0] != url
+                ]
                 
-                if result['success']:
-                    content = result.get('content', '').lower()
-                    domain = urlparse(url).netloc
-                    
-                    # Try to identify product from content or URL
-                    for category, products in GENENTECH_PRODUCTS.items():
-                        for product in products:
-                            brand_lower = product['brandName'].lower()
-                            generic_lower = product['genericName'].lower()
-                            
-                            if brand_lower in domain or brand_lower in content or generic_lower in content:
-                                product_name = product['brandName']
-                                generic_name = product['genericName']
-                                break
-                        if product_name:
-                            break
-            except:
-                pass
+                # Try to identify product from the URL first, then the content
+                matcher = product_matcher.get_matcher(GENENTECH_PRODUCTS)
+                mentions = matcher.find(page.text)
+                product = matcher.find_in_domain(urlparse(url).netloc) or (mentions[0] if mentions else None)
+                if product:
+                    product_name = product['brandName']
+                    generic_name = product['genericName']
+            except Exception as e:
+                logging.warning(f"Could not compare {url} with crawled pages: {e}")
+        elif product_name:
+            matches = index.similar_to_text(f"{product_name} {generic_name or ''}", k=100)
+        
+        # Crawled pages ranked by cosine similarity, grouped into the requested categories;
+        # pages that have since gone away are dropped
+        checker = link_check.get_checker()
+        similar_sites.update(checker.filter_groups(similarity.group(matches, search_types, GENENTECH_PRODUCTS, product_name)))
         
-        # Generate recommendations based on product name if available
+        # Generate recommendations based on product name if available; these only
+        # fill categories the crawled corpus has nothing for yet
         if product_name:
             product_lower = product_name.lower()
             generic_lower = generic_name.lower() if generic_name else ""
             
             # Official product websites
-            if "Official product websites" in search_types:
+            if "Official product websites" in search_types and "Official product websites" not in similar_sites:
                 similar_sites["Official product websites"] = [
                     {"name": f"{product_name}.com", "url": f"https://www.{product_lower}.com"},
                     {"name": f"{product_name} HCP", "url": f"https://www.{product_lower}hcp.com"}
                 ]
             
             # Manufacturer resources
-            if "Manufacturer resources" in search_types:
+            if "Manufacturer resources" in search_types and "Manufacturer resources" not in similar_sites:
                 similar_sites["Manufacturer resources"] = [
                     {"name": f"{product_name} on Genentech.com", "url": f"https://www.gene.com/medical-professionals/medicines/{product_lower}"},
                     {"name": "Genentech Patient Foundation", "url": "https://www.gene.com/patients/patient-foundation"}
                 ]
             
             # Healthcare professional resources
-            if "Healthcare professional resources" in search_types:
+            if "Healthcare professional resources" in search_types and "Healthcare professional resources" not in similar_sites:
                 similar_sites["Healthcare professional resources"] = [
                     {"name": f"{product_name} Prescribing Information", "url": f"https://www.gene.com/download/pdf/{product_lower}_prescribing.pdf"},
                     {"name": "Dosing Calculator", "url": f"https://www.{product_lower}hcp.com/dosing"},
-                    {"name": f"{product_name} on Medscape", "url": f"https://reference.medscape.com/drug/{product_lower}-{generic_lower}-999999"}
+                    {"name": f"{product_name} on Medscape", "url": f"https://search.medscape.com/search/?q={product_lower}%20{generic_lower}"}
                 ]
             
             # Patient resources
-            if "Patient resources" in search_types:
+            if "Patient resources" in search_types and "Patient resources" not in similar_sites:
                 similar_sites["Patient resources"] = [
                     {"name": f"{product_name} Patient Support", "url": f"https://www.{product_lower}.com/patient-support"},
                     {"name": "Financial Assistance", "url": f"https://www.{product_lower}.com/financial-support"},
                     {"name": f"{product_name} on RxList", "url": f"https://www.rxlist.com/search/rxl.htm?q={product_lower}"}
                 ]
             
+            # Hide suggestions that do not respond, checking them all at once
+            similar_sites = checker.filter_groups(similar_sites)
+            
             # Clinical trial databases 
             if "Clinical trial databases" in search_types:
                 similar_sites["Clinical trial databases"] = [
@@ -0,0 +1,265 @@
+"""Concurrent crawl engine.
+
+URLs are taken from a priority frontier and requested concurrently
+(bounded by a global limit and per-host politeness). Fetched HTML pages
+are parsed, converted and extracted on a process pool (see parse_pool.py)
+while the next chunk is being fetched. Results are emitted in a
+deterministic order (priority, then breadth-first), so merged output does
+not depend on network timing.
+"""
+import os
+import asyncio
+import logging
+import threading
+from functools import partial
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import http_cache
+import perf
+import politeness
+from frontier import Frontier
+from page_model import ParsedPage
+from parse_pool import get_pool as get_parse_pool, parse_response, reset_pool as reset_parse_pool
+
+logger = logging.getLogger(__name__)
+
+CRAWL_CONCURRENCY = int(os.environ.get("CRAWL_CONCURRENCY", 8))
+POOL_SIZE_PER_HOST = int(os.environ.get("POOL_SIZE_PER_HOST", 4))
+MAX_RETRIES = 2
+USER_AGENT = "Mozilla/5.0 (compatible; LLMsTxtGenerator/1.0)"
+
+
+class HostPool:
+    """One keep-alive `requests.Session` per host, shared across crawls."""
+
+    def __init__(self, pool_size=POOL_SIZE_PER_HOST):
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = perf.install_connection_timing(HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = USER_AGENT
+                self._sessions[host] = session
+            return session
+
+
+_pool = HostPool()
+
+
+def extract_links(base_url, html):
+    """Return same-host links from a page, in document order, without fragments."""
+    return ParsedPage(base_url, html).internal_links
+
+
+def default_process_page(url, response):
+    page = ParsedPage.from_response(url, response)
+    return {"url": url, "title": page.title, "content": page.markdown}, page.internal_anchors
+
+
+class AsyncCrawler:
+    def __init__(self, concurrency=CRAWL_CONCURRENCY, respect_robots=politeness.RESPECT_ROBOTS_TXT, pool=None, timeout=30,
+                 dedup=None, parse_pool=None, prerender=(False,), extract=None, accept=http_cache.HTML_TYPES,
+                 max_bytes=http_cache.FETCH_MAX_BYTES):
+        self.concurrency = concurrency
+        self.respect_robots = respect_robots
+        # Optional dedup.DedupIndex; near-duplicate pages skip process_page
+        self.dedup = dedup
+        self.pool = pool or _pool
+        self.timeout = timeout
+        # Content types worth downloading (None for any) and the per-body byte cap
+        self.accept = accept
+        self.max_bytes = max_bytes
+        # Process pool for parsing; the shared one by default, False to parse on the crawl thread
+        self.parse_pool = get_parse_pool() if parse_pool is None else parse_pool
+        # Markdown renderings (ignore_links values) the workers produce up front
+        self.prerender = prerender
+        # Optional picklable callable run on each ParsedPage in the worker; its result is page.extracted
+        self.extract = extract
+
+    def allowed(self, url):
+        return not self.respect_robots or politeness.allowed(url, USER_AGENT)
+
+    async def _fetch(self, url):
+        cache = http_cache.get_cache()
+        session = self.pool.session_for(url)
+        # Fresh cache hits never reach the host, so they skip the throttle
+        fetch = partial(cache.get, url, session=session, timeout=self.timeout, accept=self.accept, max_bytes=self.max_bytes)
+        if cache.is_fresh(url):
+            return await asyncio.to_thread(fetch)
+
+        policy = politeness.policy_for(url, USER_AGENT, self.respect_robots)
+        for attempt in range(MAX_RETRIES + 1):
+            with perf.span("throttle", url):
+                await policy.acquire()
+            try:
+                response = await asyncio.to_thread(fetch)
+            except requests.RequestException:
+                # A host that is down or timing out is slowed like one answering 503
+                policy.record_error()
+                raise
+            policy.record(response.status_code, response.headers)
+            if response.status_code not in politeness.THROTTLE_STATUSES:
+                break
+        return response
+
+    async def _fetch_or_skip(self, url):
+        with perf.span("robots", url):
+            allowed = await asyncio.to_thread(self.allowed, url)
+        if not allowed:
+            return None
+        return await self._fetch(url)
+
+    async def _fetch_all(self, urls):
+        return await asyncio.gather(*(self._fetch_or_skip(url) for url in urls), return_exceptions=True)
+
+    @staticmethod
+    def _parseable(response):
+        return (
+            response is not None and not isinstance(response, Exception) and response.ok
+            and "html" in response.headers.get("Content-Type", "text/html")
+        )
+
+    def _submit_parse(self, urls, responses):
+        """Queue fetched HTML pages on the parse pool, returning a future (or None) per URL."""
+        futures = [None] * len(urls)
+        if not self.parse_pool:
+            return futures
+        for index, (url, response) in enumerate(zip(urls, responses)):
+            if not self._parseable(response):
+                continue
+            try:
+                futures[index] = self.parse_pool.submit(
+                    parse_response, url, response.content, response.encoding, response.status_code,
+                    self.prerender, self.dedup is not None, self.extract,
+                )
+            except (BrokenProcessPool, RuntimeError) as e:
+                # The pool died or was replaced; the rest of this chunk is parsed in-thread
+                logger.warning("Could not queue %s for parsing: %s", url, e)
+                reset_parse_pool(self.parse_pool)
+                self.parse_pool = get_parse_pool()
+                break
+        return futures
+
+    def _collect(self, url, response, future):
+        """Attach a worker's parse result to `response`, or return None to parse in-thread."""
+        try:
+            with perf.span("pool", url):
+                parsed = future.result()
+        except Exception as e:
+            logger.warning("Parse worker failed for %s, parsing in-thread: %s", url, e)
+            if isinstance(e, BrokenProcessPool):
+                reset_parse_pool(self.parse_pool)
+                self.parse_pool = get_parse_pool()
+            return None
+        for stage, start, duration, nbytes, cpu in parsed["spans"]:
+            perf.record(stage, url, duration, nbytes, start=start, cpu=cpu)
+        ParsedPage.from_parsed(url, response, parsed)
+        return parsed
+
+    def _process(self, url, current_depth, response, process_page, future=None):
+        page = {"url": url, "depth": current_depth, "data": None, "error": None, "duplicate_of": None}
+        links = []
+        parsed = self._collect(url, response, future) if future is not None else None
+        if response is None:
+            page["error"] = "Disallowed by robots.txt"
+        elif isinstance(response, Exception):
+            page["error"] = str(response)
+        elif not response.ok:
+            page["error"] = response.skipped or f"HTTP {response.status_code}"
+        elif self.dedup is not None and (duplicate_of := self._duplicate_of(url, response, parsed)):
+            page["duplicate_of"] = duplicate_of
+        else:
+            try:
+                with perf.span("process", url):
+                    page["data"], links = process_page(url, response)
+            except Exception as e:
+                logger.warning("Failed to process %s: %s", url, e)
+                page["error"] = str(e)
+        return page, links
+
+    def _duplicate_of(self, url, response, parsed=None):
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            return None
+        if parsed is not None:
+            return self.dedup.check_fingerprint(url, parsed["fingerprint"])
+        text = ParsedPage.from_response(url, response).text
+        with perf.span("dedup", url):
+            return self.dedup.check(url, text)
+
+    def iter_crawl(self, url, depth=2, max_pages=10, process_page=None, prioritize=True):
+        """Yield page records as soon as each is processed.
+
+        URLs come off a priority frontier (see frontier.py): high-value links
+        such as prescribing information and safety pages go first, and equally
+        scored links keep breadth-first order. Pages are fetched in chunks of
+        `concurrency`, so at most that many responses are held in memory at
+        once however large the crawl (twice that with a parse pool, which
+        parses one chunk while the next is fetched; that chunk is picked
+        before the links of the one being parsed are known). `process_page`
+        may return links as URLs or (url, anchor text) pairs.
+        """
+        process_page = process_page or default_process_page
+        # Only the seen-set's starting size; it grows with the links discovered
+        frontier = Frontier(url, depth, capacity=max(1000, max_pages * 50), prioritize=prioritize)
+        loop = asyncio.new_event_loop()
+        try:
+            count = 0
+            pending = None
+            while frontier and count < max_pages or pending:
+                fetched = None
+                budget = max_pages - count - (len(pending[0]) if pending else 0)
+                if frontier and budget > 0:
+                    chunk = frontier.pop(min(self.concurrency, budget))
+                    chunk_urls = [link for link, _ in chunk]
+                    responses = loop.run_until_complete(self._fetch_all(chunk_urls))
+                    fetched = (chunk, responses, self._submit_parse(chunk_urls, responses))
+                if fetched and not self.parse_pool:
+                    pending, fetched = fetched, None
+                for (link, current_depth), response, future in zip(*pending) if pending else ():
+                    page, links = self._process(link, current_depth, response, process_page, future)
+                    for found in links:
+                        found, text = found if isinstance(found, tuple) else (found, "")
+                        # Disallowed links never take a slot in the page budget
+                        if current_depth < depth and self.allowed(found):
+                            frontier.push(found, current_depth + 1, text)
+                    count += 1
+                    yield page
+                pending = fetched
+        finally:
+            loop.close()
+
+    def iter_fetch(self, urls, process_page=None):
+        """Fetch a fixed list of URLs, yielding page records in the given order."""
+        process_page = process_page or default_process_page
+        chunks = [urls[start:start + self.concurrency] for start in range(0, len(urls), self.concurrency)]
+        loop = asyncio.new_event_loop()
+        try:
+            pending = None
+            for chunk in chunks + [None]:
+                fetched = None
+                if chunk:
+                    responses = loop.run_until_complete(self._fetch_all(chunk))
+                    fetched = (chunk, responses, self._submit_parse(chunk, responses))
+                if fetched and not self.parse_pool:
+                    pending, fetched = fetched, None
+                for url, response, future in zip(*pending) if pending else ():
+                    yield self._process(url, 1, response, process_page, future)[0]
+                pending = fetched
+        finally:
+            loop.close()
+
+    def crawl(self, url, depth=2, max_pages=10, process_page=None):
+        """Crawl from `url` and return page records in breadth-first order."""
+        return list(self.iter_crawl(url, depth, max_pages, process_page))
@@ -0,0 +1 @@
+"""Offline benchmark suite: fixture corpus, stand-in web server and regression checks."""
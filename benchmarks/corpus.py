@@ -0,0 +1,198 @@
+"""Deterministic fixture corpus for the benchmarks.
+
+`build()` writes synthetic pharma product sites (with sitemaps and
+package insert PDFs) and large ClinicalTrials.gov-style study pages to a
+directory. The same seed and scale always produce byte-identical files,
+so benchmark runs on different machines measure the same work.
+"""
+import os
+import gzip
+import json
+import random
+
+CORPUS_VERSION = 2
+# Package inserts per product: the current PI plus archived revisions
+PI_REVISIONS = 4
+PRODUCTS = [
+    ("Zentrava", "velumotinib", "Oncology"),
+    ("Corlisma", "adetrazumab", "Immunology"),
+    ("Nuvexa", "oprelimab", "Neuroscience"),
+]
+SECTIONS = [
+    "Indications and Usage", "Dosage and Administration", "Dosage Forms and Strengths", "Warnings and Precautions",
+    "Adverse Reactions", "Mechanism of Action", "Clinical Studies", "Patient Support",
+]
+WORDS = (
+    "patients treatment dose infusion therapy efficacy safety adverse reactions hepatotoxicity neutropenia "
+    "monitoring baseline week cycle administered intravenously subcutaneous tablet mg kg response rate "
+    "progression survival randomized placebo controlled trial receptor antibody inhibitor pathway tumor "
+    "relapse remission clinical laboratory liver enzymes infection hypersensitivity discontinue interrupt "
+    "physician pharmacist caregiver insurance copay program support enrollment eligible criteria"
+).split()
+PAGE_KINDS = ["overview", "dosing", "safety", "efficacy", "moa", "patients", "hcp", "support", "faq", "news"]
+
+
+def sentence(rng, words=14):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def paragraph(rng, sentences=5):
+    return " ".join(sentence(rng, rng.randint(8, 20)) for _ in range(sentences))
+
+
+def product_page(rng, brand, generic, path, links, pi_path):
+    """A product page with the chrome (navigation, scripts, ads) real sites carry."""
+    nav = "".join(f'<li><a href="/{link}">{link.split(".")[0].replace("-", " ").title()}</a></li>' for link in links[:12])
+    body = []
+    for title in rng.sample(SECTIONS, 4):
+        body.append(f"<h2>{title}</h2><p>{paragraph(rng)}</p>")
+        body.append("<ul>" + "".join(f"<li>{sentence(rng, 8)}</li>" for _ in range(rng.randint(3, 8))) + "</ul>")
+        if rng.random() < 0.4:
+            rows = "".join(
+                f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 40)}%</td><td>{rng.randint(1, 40)}%</td></tr>"
+                for _ in range(6)
+            )
+            body.append(f"<table><tr><th>Reaction</th><th>{brand}</th><th>Placebo</th></tr>{rows}</table>")
+    related = "".join(f'<a href="/{link}">{sentence(rng, 3)}</a> ' for link in links[12:])
+    return (
+        f"<!DOCTYPE html><html><head><title>{brand} ({generic}) | {path}</title>"
+        f"<style>{'.c{color:#333}' * 200}</style><script>{'var x=1;' * 400}</script></head><body>"
+        f'<header><nav><ul>{nav}</ul></nav></header><div class="cookie-banner">{sentence(rng)}</div>'
+        f"<main><h1>{brand} ({generic})</h1><p>{paragraph(rng, 3)}</p>{''.join(body)}"
+        f'<p><a href="/{pi_path}">Full Prescribing Information</a></p><p>{related}</p></main>'
+        f'<aside class="promo">{paragraph(rng, 2)}</aside><footer>{sentence(rng)}</footer></body></html>'
+    )
+
+
+def trial_page(rng, nct_id, brand, generic, locations, subpages):
+    """A large study record laid out like a ClinicalTrials.gov page."""
+    items = lambda count, words: "".join(f"<li>{sentence(rng, words)}</li>" for _ in range(count))
+    sites = "".join(
+        f"<li>{rng.choice(WORDS).title()} Medical Center, {rng.choice(WORDS).title()}ville, {rng.randint(10000, 99999)}</li>"
+        for _ in range(locations)
+    )
+    tabs = "".join(f'<a href="/trials/{nct_id}-{name}.html">{name.title()}</a> ' for name in subpages)
+    return (
+        f"<html><head><title>{nct_id} | A Study of {brand}</title><script>{'var t=0;' * 300}</script></head><body>"
+        f"<nav>{tabs}</nav><main><h1>A Phase 3 Study of {brand} ({generic}) {nct_id}</h1>"
+        f"<p><b>Study Type:</b> Interventional</p><p>Recruiting</p><p>Phase 3</p>"
+        f"<p>Enrollment (Estimated): {rng.randint(100, 3000)}</p><p>Study Start: March {rng.randint(1, 28)}, 2024</p>"
+        f"<p>Study Completion: June {rng.randint(1, 28)}, 2029</p><p>Sponsor: Example Pharma, Inc.</p>"
+        f"<h2>Brief Summary</h2><p>{paragraph(rng, 12)}</p>"
+        f"<h2>Conditions</h2><ul>{items(4, 3)}</ul>"
+        f"<h2>Interventions</h2><ul><li>Drug: {brand}</li><li>Drug: Placebo</li></ul>"
+        f"<h2>Primary Outcome Measures</h2><ol>{items(6, 16)}</ol>"
+        f"<h2>Secondary Outcome Measures</h2><ol>{items(20, 16)}</ol>"
+        f"<h2>Eligibility Criteria</h2><p>Inclusion Criteria:</p><ul>{items(30, 12)}</ul>"
+        f"<p>Exclusion Criteria:</p><ul>{items(40, 12)}</ul>"
+        f"<h2>Locations</h2><ul>{sites}</ul></main></body></html>"
+    )
+
+
+def pdf_document(pages):
+    """A minimal text-only PDF with one Helvetica content stream per page of lines."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + index * 2} 0 R" for index in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font = 3 + len(pages) * 2
+    for index, lines in enumerate(pages):
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines)
+        content = "BT /F1 9 Tf 11 TL 40 780 Td " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + index * 2} 0 R "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> >>".encode()
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return out
+
+
+def package_insert(rng, brand, generic, pages):
+    headings = [
+        ("1 INDICATIONS AND USAGE", 2), ("2 DOSAGE AND ADMINISTRATION", 3), ("3 DOSAGE FORMS AND STRENGTHS", 1),
+        ("5 WARNINGS AND PRECAUTIONS", 4), ("6 ADVERSE REACTIONS", 3), ("12 CLINICAL PHARMACOLOGY", 1),
+        ("12.1 Mechanism of Action", 1), ("14 CLINICAL STUDIES", 3),
+    ]
+    lines = ["HIGHLIGHTS OF PRESCRIBING INFORMATION", f"{brand} ({generic}) injection, for intravenous use",
+             "WARNING: SERIOUS INFECTIONS", "FULL PRESCRIBING INFORMATION"]
+    per_page = 60
+    while len(lines) < pages * per_page:
+        for heading, weight in headings:
+            lines.append(heading)
+            lines.extend(sentence(rng, 12) for _ in range(weight * 6))
+    return pdf_document([lines[start:start + per_page] for start in range(0, pages * per_page, per_page)])
+
+
+def sitemap(urls, lastmod):
+    entries = "".join(f"<url><loc>{url}</loc><lastmod>{lastmod}</lastmod></url>" for url in urls)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+
+
+def _write(directory, path, content):
+    full = os.path.join(directory, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "wb") as out:
+        out.write(content.encode("utf-8") if isinstance(content, str) else content)
+
+
+def build(directory, scale=1, seed=1234):
+    """Write the corpus to `directory` (skipped if an identical one is there) and return its manifest.
+
+    The manifest lists, per product, the site path and its page paths, and
+    the trial and PI paths, relative to the server root.
+    """
+    manifest_path = os.path.join(directory, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as existing:
+            manifest = json.load(existing)
+        if (manifest["version"], manifest["scale"], manifest["seed"]) == (CORPUS_VERSION, scale, seed):
+            return manifest
+
+    rng = random.Random(seed)
+    manifest = {"version": CORPUS_VERSION, "scale": scale, "seed": seed, "sites": [], "trials": [], "packageInserts": []}
+    pages_per_site = 60 * scale
+    for brand, generic, area in PRODUCTS:
+        site = brand.lower()
+        paths = ["index.html"] + [
+            f"{PAGE_KINDS[index % len(PAGE_KINDS)]}-{index}.html" for index in range(1, pages_per_site)
+        ]
+        pi_path = f"pi/{site}_pi.pdf"
+        for path in paths:
+            links = [f"{site}/{link}" for link in rng.sample(paths, min(20, len(paths)))]
+            _write(directory, f"{site}/{path}", product_page(rng, brand, generic, path, links, pi_path))
+        for revision in range(PI_REVISIONS):
+            path = pi_path if revision == 0 else f"pi/{site}_pi_rev{revision}.pdf"
+            _write(directory, path, package_insert(rng, brand, generic, pages=24 * scale))
+            manifest["packageInserts"].append(path)
+
+        # A sitemap index pointing at a gzipped sitemap, as large sites publish them
+        urls = [f"{{base}}/{site}/{path}" for path in paths]
+        _write(directory, f"{site}/sitemap-pages.xml.gz", gzip.compress(sitemap(urls, "2026-01-01").encode(), mtime=0))
+        _write(
+            directory, f"{site}/sitemap.xml",
+            '<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            f"<sitemap><loc>{{base}}/{site}/sitemap-pages.xml.gz</loc></sitemap></sitemapindex>",
+        )
+        manifest["sites"].append({"brand": brand, "genericName": generic, "area": area, "root": f"{site}/index.html",
+                                  "sitemap": f"{site}/sitemap.xml", "pages": [f"{site}/{path}" for path in paths]})
+
+        for number in range(4 * scale):
+            nct_id = f"NCT{rng.randint(10000000, 99999999)}"
+            subpages = ["results", "history"]
+            _write(directory, f"trials/{nct_id}.html", trial_page(rng, nct_id, brand, generic, 400, subpages))
+            for name in subpages:
+                _write(directory, f"trials/{nct_id}-{name}.html", trial_page(rng, nct_id, brand, generic, 40, []))
+            manifest["trials"].append(f"trials/{nct_id}.html")
+
+    _write(directory, "manifest.json", json.dumps(manifest, indent=2))
+    return manifest
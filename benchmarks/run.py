@@ -0,0 +1,334 @@
+"""Offline benchmarks for the crawl, extraction and similarity paths.
+
+Builds the fixture corpus, serves it from a local FixtureServer and runs
+each scenario in its own subprocess with fresh caches, so peak RSS and
+cache state belong to that scenario alone. Reports pages per second,
+p50/p95 per-page latency, peak RSS, CPU time and per-stage CPU time (from
+perf.py spans), and compares them with benchmarks/baseline.json:
+
+    python -m benchmarks.run                    # all scenarios, fail on regression
+    python -m benchmarks.run crawl trials       # selected scenarios
+    python -m benchmarks.run --update-baseline  # record new baselines
+
+Exits 1 when any metric is worse than its baseline by more than the
+tolerance.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+from benchmarks import corpus
+from benchmarks.server import FixtureServer
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Run-to-run noise on a quiet machine is about +/-20%
+DEFAULT_TOLERANCE = 0.35
+# Stages with less CPU than this in the baseline are too noisy to compare
+MIN_STAGE_CPU_MS = 50
+# A regression must also exceed these absolute amounts, so tiny timings cannot flap
+SLACK = {"pagesPerSec": 0.5, "p95Ms": 20, "peakRssMb": 5, "cpuMs": 100, "stageCpuMs": MIN_STAGE_CPU_MS}
+# Work done after a page is processed, left out of its latency
+LATENCY_EXCLUDED_STAGES = ("merge",)
+QUERY_ROUNDS = 5
+# (metric, direction in which it gets worse)
+CHECKS = [("pagesPerSec", "lower"), ("p95Ms", "higher"), ("peakRssMb", "higher"), ("cpuMs", "higher")]
+
+
+def _crawl(base, manifest, workdir):
+    import llms_txt
+
+    count = 0
+    for site in manifest["sites"]:
+        output_path = os.path.join(workdir, f"{site['brand']}.txt")
+        for event in llms_txt.generate(f"{base}/{site['root']}", depth=3, max_pages=len(site["pages"]),
+                                       output_path=output_path):
+            if event["type"] in ("page", "duplicate", "error"):
+                count += 1
+    return count, None
+
+
+def _trials(base, manifest, workdir):
+    import ct_extract
+
+    for trial in manifest["trials"]:
+        ct_extract.extract_trial(f"{base}/{trial}", depth=2, max_pages=3)
+    return len(manifest["trials"]) * 3, None
+
+
+def _sitemap(base, manifest, workdir):
+    import sitemap
+
+    store = sitemap.UrlStore(os.path.join(workdir, "url_store.sqlite3"))
+    extract_schema = lambda page: {"genericName": page.title, "indications": page.markdown[:200]}
+    first = sitemap.incremental_crawl(f"{base}/{manifest['sites'][0]['root']}", extract_schema, store=store)
+    # The second pass finds every lastmod unchanged and fetches nothing
+    sitemap.incremental_crawl(f"{base}/{manifest['sites'][0]['root']}", extract_schema, store=store)
+    return sum(len(urls) for bucket, urls in first["pages"].items() if bucket != "skipped"), None
+
+
+def _package_inserts(base, manifest, workdir):
+    import pi_pdf
+
+    if pi_pdf.PdfReader is None:
+        return None, None
+    latencies = []
+    for path in manifest["packageInserts"]:
+        start = time.perf_counter()
+        pi_pdf.parse_package_insert(f"{base}/{path}")
+        latencies.append(time.perf_counter() - start)
+    # Served from the extracted-text cache; counted in throughput, not latency
+    for path in manifest["packageInserts"]:
+        pi_pdf.parse_package_insert(f"{base}/{path}")
+    return len(latencies) * 2, latencies
+
+
+def _setup_similarity(base, manifest, workdir):
+    import search_index
+    from page_model import ParsedPage
+
+    index = search_index.get_index()
+    for site in manifest["sites"]:
+        for path in site["pages"]:
+            with open(os.path.join(manifest["root"], path), encoding="utf-8") as source:
+                page = ParsedPage(f"{base}/{path}", source.read())
+            index.add_page(page.url, page.title, page.markdown)
+
+
+def _similarity(base, manifest, workdir):
+    import similarity
+
+    index = similarity.get_similarity_index()
+    latencies = []
+    for _ in range(QUERY_ROUNDS):
+        for path in (path for site in manifest["sites"] for path in site["pages"]):
+            start = time.perf_counter()
+            results = index.similar_to_url(f"{base}/{path}", k=50)
+            similarity.group(results, [category for category, _ in similarity.CATEGORY_RULES])
+            latencies.append(time.perf_counter() - start)
+    return len(latencies), latencies
+
+
+# name: (setup, run); run returns (pages, per-page latencies or None to derive them from perf spans)
+SCENARIOS = {
+    "crawl": (None, _crawl),
+    "trials": (None, _trials),
+    "sitemap": (None, _sitemap),
+    "package_inserts": (None, _package_inserts),
+    "similarity": (_setup_similarity, _similarity),
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def page_latencies(recorder):
+    """Per-page latency: first span start to last span end for each URL."""
+    bounds = {}
+    for item in recorder.spans:
+        if item["url"] and item["stage"] not in LATENCY_EXCLUDED_STAGES:
+            start, end = bounds.get(item["url"], (item["start"], item["start"]))
+            bounds[item["url"]] = (min(start, item["start"]), max(end, item["start"] + item["duration"]))
+    return [end - start for start, end in bounds.values()]
+
+
+def run_scenario(name, base, manifest, workdir):
+    """Run one scenario in this process and return its metrics."""
+    import perf
+    import parse_pool
+
+    setup, run = SCENARIOS[name]
+    if setup:
+        setup(base, manifest, workdir)
+    times = os.times()
+    start = time.perf_counter()
+    with perf.recording() as recorder:
+        pages, latencies = run(base, manifest, workdir)
+    seconds = time.perf_counter() - start
+    # Shut the parse workers down so their peak RSS and CPU are counted as children
+    pool = parse_pool.get_pool()
+    if pool is not None:
+        pool.shutdown(wait=True)
+    end_times = os.times()
+    if pages is None:
+        return {"skipped": True}
+
+    latencies = latencies if latencies is not None else page_latencies(recorder)
+    cpu = sum(end_times[:4]) - sum(times[:4])
+    return {
+        "pages": pages,
+        "seconds": round(seconds, 3),
+        "pagesPerSec": round(pages / seconds, 2) if seconds else None,
+        "p50Ms": round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        "p95Ms": round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        "peakRssMb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "workerPeakRssMb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "cpuMs": round(cpu * 1000, 1),
+        "stageCpuMs": {stage: round(values["cpuMs"], 1) for stage, values in recorder.by_stage().items()},
+    }
+
+
+def environment(args):
+    return {
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "parseWorkers": args.parse_workers,
+        "scale": args.scale,
+        "latencyMs": args.latency,
+        "errorRate": args.error_rate,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages, one per metric worse than the baseline allows."""
+    failures = []
+    for name, metrics in results.items():
+        expected = baseline.get(name)
+        if not expected or metrics.get("skipped") or expected.get("skipped"):
+            continue
+        checks = [(metric, direction, metrics.get(metric), expected.get(metric)) for metric, direction in CHECKS]
+        for stage, cpu_ms in expected.get("stageCpuMs", {}).items():
+            if cpu_ms >= MIN_STAGE_CPU_MS:
+                checks.append((f"stageCpuMs.{stage}", "higher", metrics["stageCpuMs"].get(stage, 0.0), cpu_ms))
+        for metric, direction, value, reference in checks:
+            if value is None or not reference:
+                continue
+            change = (value - reference) / reference
+            if abs(value - reference) < SLACK[metric.split(".")[0]]:
+                continue
+            if (direction == "lower" and change < -tolerance) or (direction == "higher" and change > tolerance):
+                failures.append(f"{name}: {metric} {value} vs baseline {reference} ({change:+.0%})")
+    return failures
+
+
+def print_table(results, baseline):
+    columns = ["pages", "seconds", "pagesPerSec", "p50Ms", "p95Ms", "peakRssMb", "cpuMs"]
+    print(f"{'scenario':<16}" + "".join(f"{column:>14}" for column in columns))
+    for name, metrics in results.items():
+        if metrics.get("skipped"):
+            print(f"{name:<16}  skipped")
+            continue
+        print(f"{name:<16}" + "".join(f"{str(metrics.get(column)):>14}" for column in columns))
+        reference = baseline.get(name)
+        if reference and not reference.get("skipped"):
+            print(f"{'  baseline':<16}" + "".join(f"{str(reference.get(column)):>14}" for column in columns))
+        stages = ", ".join(f"{stage} {cpu_ms:.0f}" for stage, cpu_ms in metrics["stageCpuMs"].items() if cpu_ms >= 1)
+        print(f"{'  cpu ms':<16}  {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks and compare them with the baseline.")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--scale", type=int, default=1, help="corpus size multiplier")
+    parser.add_argument("--latency", type=float, default=20, help="milliseconds of server latency per response")
+    parser.add_argument("--jitter", type=float, default=10, help="+/- milliseconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of pages that answer 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of pages that answer 429 once")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed relative regression")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    parser.add_argument("--corpus", default=os.path.join(".cache", "bench_corpus"))
+    parser.add_argument("--tmp", default=os.path.join(".cache", "bench_tmp"),
+                        help="where scenario caches live; on disk under .cache by default, like the app's caches, "
+                             "so commits and flushes are measured")
+    parser.add_argument("--parse-workers", type=int, default=max(2, os.cpu_count() or 1),
+                        help="PARSE_WORKERS for the scenarios; at least 2 by default so the parse pool is exercised")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    manifest = corpus.build(args.corpus, args.scale)
+    manifest["root"] = args.corpus
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args.base, manifest, args.workdir)))
+        return
+
+    server = FixtureServer(args.corpus, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                           sitemaps=[site["sitemap"] for site in manifest["sites"]])
+    base = server.start()
+    results = {}
+    os.makedirs(args.tmp, exist_ok=True)
+    try:
+        for name in args.scenarios or SCENARIOS:
+            workdir = tempfile.mkdtemp(prefix=f"bench_{name}_", dir=args.tmp)
+            env = dict(
+                os.environ,
+                CACHE_PATH=os.path.join(workdir, "http_cache.sqlite3"),
+                SEARCH_INDEX_PATH=os.path.join(workdir, "search_index.sqlite3"),
+                SIMILARITY_INDEX_PATH=os.path.join(workdir, "similarity_index.npz"),
+                URL_STORE_PATH=os.path.join(workdir, "url_store.sqlite3"),
+                PI_CACHE_DIR=os.path.join(workdir, "package_inserts"),
+                OUTPUT_DIR=workdir,
+                PARSE_WORKERS=str(args.parse_workers),
+                # Measure our code, not the politeness delay
+                RATE_LIMIT="1000",
+            )
+            try:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.run", "--child", name, "--base", base, "--workdir", workdir,
+                     "--corpus", args.corpus, "--scale", str(args.scale)],
+                    env=env, check=True, capture_output=True, text=True,
+                ).stdout
+            except subprocess.CalledProcessError as e:
+                sys.stderr.write(e.stderr)
+                raise SystemExit(f"Scenario {name} failed")
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            results[name] = json.loads(output.strip().splitlines()[-1])
+    finally:
+        server.stop()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as source:
+            baseline = json.load(source)
+    current = environment(args)
+    print_table(results, baseline.get("scenarios", {}))
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump({"environment": current, "scenarios": results}, out, indent=2)
+
+    if args.update_baseline:
+        scenarios = dict(baseline.get("scenarios", {}), **results)
+        with open(args.baseline, "w") as out:
+            json.dump({"environment": current, "scenarios": scenarios}, out, indent=2)
+            out.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not baseline:
+        print("No baseline to compare with; run with --update-baseline to record one")
+        return
+
+    recorded = baseline.get("environment", {})
+    for key in ("scale", "latencyMs", "errorRate"):
+        if recorded.get(key) != current[key]:
+            raise SystemExit(f"Baseline was recorded with {key}={recorded.get(key)}, not {current[key]}; "
+                             "rerun with matching options or update the baseline")
+    if (recorded.get("cpus"), recorded.get("parseWorkers")) != (current["cpus"], current["parseWorkers"]):
+        print(f"Warning: baseline recorded on {recorded.get('cpus')} CPUs with PARSE_WORKERS={recorded.get('parseWorkers')}")
+    failures = compare(results, baseline.get("scenarios", {}), args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        raise SystemExit(1)
+    print(f"No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
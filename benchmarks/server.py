@@ -0,0 +1,148 @@
+"""Local stand-in web server for the benchmark corpus.
+
+Serves a corpus directory over HTTP with configurable latency and fault
+injection. Faults are chosen by hashing the request path, so the same
+pages fail on every run: `error_rate` of paths answer 500, and
+`throttle_rate` of paths answer 429 with Retry-After on their first
+request only, which exercises the crawler's backoff.
+
+    python -m benchmarks.server --port 8800 --latency 50 --error-rate 0.02
+"""
+import os
+import sys
+import gzip
+import time
+import random
+import hashlib
+import argparse
+import mimetypes
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote
+
+
+def _fraction(path, salt):
+    digest = hashlib.blake2b(f"{salt}:{path}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2 ** 64
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _body(self, path):
+        server = self.server
+        if path == "/robots.txt":
+            lines = ["User-agent: *", "Allow: /"] + [f"Sitemap: {server.base}/{site}" for site in server.sitemaps]
+            return "\n".join(lines).encode(), "text/plain"
+        full = os.path.realpath(os.path.join(server.root, path.lstrip("/")))
+        if not full.startswith(server.root + os.sep) or not os.path.isfile(full):
+            return None, None
+        with open(full, "rb") as source:
+            body = source.read()
+        # Sitemaps are written with a {base} placeholder for the server's own address
+        if full.endswith(".xml.gz"):
+            body = gzip.compress(gzip.decompress(body).replace(b"{base}", server.base.encode()), mtime=0)
+        elif full.endswith(".xml"):
+            body = body.replace(b"{base}", server.base.encode())
+        kind = "application/x-gzip" if full.endswith(".gz") else mimetypes.guess_type(full)[0] or "application/octet-stream"
+        return body, kind
+
+    def do_GET(self):
+        server = self.server
+        path = unquote(urlparse(self.path).path)
+        if server.latency or server.jitter:
+            time.sleep(max(0.0, server.latency + server.rng.uniform(-server.jitter, server.jitter)))
+        if path != "/robots.txt":
+            if _fraction(path, "error") < server.error_rate:
+                return self._send(500, b"Injected error", {"Content-Type": "text/plain"})
+            if _fraction(path, "throttle") < server.throttle_rate and server.first_request(path):
+                return self._send(429, b"Slow down", {"Content-Type": "text/plain", "Retry-After": "1"})
+        body, kind = self._body(path)
+        if body is None:
+            return self._send(404, b"Not found", {"Content-Type": "text/plain"})
+        content_type = f"{kind}; charset=utf-8" if kind.startswith("text/") else kind
+        self._send(200, body, {"Content-Type": content_type, "Last-Modified": "Thu, 01 Jan 2026 00:00:00 GMT"})
+
+    do_HEAD = do_GET
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root, port=0, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, sitemaps=(), seed=0):
+        super().__init__(("127.0.0.1", port), FixtureHandler)
+        self.root = os.path.realpath(root)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.sitemaps = list(sitemaps)
+        self.rng = random.Random(seed)
+        self.base = f"http://127.0.0.1:{self.server_address[1]}"
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def first_request(self, path):
+        with self._lock:
+            if path in self._seen:
+                return False
+            self._seen.add(path)
+            return True
+
+    def handle_error(self, request, client_address):
+        # Clients that abort a download (byte caps, cancelled crawls) are expected
+        error = sys.exc_info()[1]
+        if not isinstance(error, (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        """Serve from a background thread and return the base URL."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self.base
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    from benchmarks import corpus
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--root", default=os.path.join(".cache", "bench_corpus"))
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=20, help="milliseconds added to every response")
+    parser.add_argument("--jitter", type=float, default=10, help="+/- milliseconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    manifest = corpus.build(args.root, args.scale)
+    server = FixtureServer(args.root, args.port, args.latency / 1000, args.jitter / 1000, args.error_rate,
+                           args.throttle_rate, [site["sitemap"] for site in manifest["sites"]])
+    print(f"Serving {args.root} at {server.base}")
+    for site in manifest["sites"]:
+        print(f"  {site['brand']}: {server.base}/{site['root']}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Catalog-wide drug schema generation.
+
+Every product in a category, or the whole catalog, is crawled from its
+suggested URLs on a worker pool under one page budget and one time budget
+for the whole batch. A product's share is fixed when it starts: the pages
+not yet handed out are split evenly over the products still waiting, and
+the time left is split over them the same way, allowing for the products
+that run alongside it. Dead suggested URLs are dropped before any budget
+is spent on them. Finished schemas are compared side by side with
+per-field completeness.
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import exports
+import link_check
+import pi_pdf
+import search_index
+from schema_merge import SchemaMerger, EMPTY_VALUES
+
+logger = logging.getLogger(__name__)
+
+CATALOG_WORKERS = int(os.environ.get("CATALOG_WORKERS", 4))
+CATALOG_MAX_PAGES = int(os.environ.get("CATALOG_MAX_PAGES", 600))
+CATALOG_TIME_BUDGET = int(os.environ.get("CATALOG_TIME_BUDGET", 1800))
+
+
+def suggested_urls(product):
+    brand = product["brandName"].lower()
+    return [
+        f"https://www.gene.com/medical-professionals/medicines/{brand}",
+        f"https://www.{brand}.com",
+        f"https://www.gene.com/patients/medicines/{brand}",
+    ]
+
+
+def products_in(catalog, category=None):
+    """Products of one category, or of every category (first listing wins), as (category, product)."""
+    products = {}
+    for name, listed in catalog.items():
+        if category is None or name == category:
+            for product in listed:
+                products.setdefault(product["brandName"], (name, product))
+    return list(products.values())
+
+
+class Budget:
+    """Pages and seconds shared by the products of one batch."""
+
+    def __init__(self, products, max_pages=CATALOG_MAX_PAGES, seconds=CATALOG_TIME_BUDGET, workers=CATALOG_WORKERS):
+        self.pages_left = max_pages
+        self.waiting = products
+        self.workers = workers
+        self.deadline = time.monotonic() + seconds
+        self._lock = threading.Lock()
+
+    def claim(self):
+        """Reserve the next product's share as (pages, deadline)."""
+        with self._lock:
+            now = time.monotonic()
+            # Rounded up, so every claim gets a page until the budget runs out
+            pages = -(-self.pages_left // self.waiting) if self.waiting else 0
+            # Up to `workers` products run at once, so each waiting one can have that share of the time left
+            seconds = max(0.0, self.deadline - now) * min(self.workers, self.waiting) / max(self.waiting, 1)
+            self.pages_left -= pages
+            self.waiting = max(self.waiting - 1, 0)
+            return pages, min(self.deadline, now + seconds)
+
+
+def generate(product, urls, crawl, pages, deadline):
+    """Build one product's combined schema from `urls`.
+
+    `crawl(url, max_pages)` returns a schema crawl result with a
+    `combined_schema`. The product's pages are split evenly over its URLs;
+    a URL is not started once the deadline has passed, though one already
+    running is allowed to finish. Returns (schema, provenance, urls crawled).
+    """
+    merger = SchemaMerger()
+    crawled = []
+    for index, url in enumerate(urls):
+        share = pages // len(urls) + (1 if index < pages % len(urls) else 0)
+        if share < 1 or time.monotonic() >= deadline:
+            continue
+        result = crawl(url, share)
+        if result and result.get("combined_schema"):
+            merger.add(result["combined_schema"], url)
+            crawled.append(url)
+    if not crawled:
+        return None, {}, []
+
+    schema = merger.result()
+    schema.setdefault("brandName", product["brandName"])
+    schema.setdefault("genericName", product["genericName"])
+    # The prescribing information PDF is the authoritative source for these fields
+    pi_pdf.enrich_schema(schema)
+    search_index.get_index().add_schema("drug", crawled[0], schema, product=schema.get("brandName"), title=schema.get("genericName"))
+    return schema, merger.provenance(), crawled
+
+
+def _result(category, product, error=None):
+    return {"category": category, "brandName": product["brandName"], "genericName": product["genericName"],
+            "schema": None, "provenance": {}, "urls": [], "pages": 0, "error": error}
+
+
+def iter_catalog(products, crawl, max_pages=CATALOG_MAX_PAGES, seconds=CATALOG_TIME_BUDGET, workers=CATALOG_WORKERS):
+    """Generate schemas for (category, product) pairs concurrently.
+
+    Yields a result dict per product as each one finishes: category,
+    brandName, genericName, schema, provenance, the URLs crawled, the pages
+    it was given and an error (None on success). Every suggested URL is
+    checked in one pass first, and only products with a live URL share the
+    budget.
+    """
+    started = time.monotonic()
+    checks = link_check.get_checker().check_all(url for _, product in products for url in suggested_urls(product))
+    live = {}
+    for category, product in products:
+        urls = [url for url in suggested_urls(product) if checks[url]["alive"]]
+        if urls:
+            live[product["brandName"]] = urls
+        else:
+            yield _result(category, product, error="No suggested URL responded")
+    products = [(category, product) for category, product in products if product["brandName"] in live]
+    budget = Budget(len(products), max_pages, seconds - (time.monotonic() - started), workers)
+
+    def run(category, product):
+        urls = live[product["brandName"]]
+        result = _result(category, product)
+        pages, deadline = budget.claim()
+        result["pages"] = pages
+        if pages < 1:
+            result["error"] = "Page budget exhausted"
+            return result
+        if time.monotonic() >= deadline:
+            result["error"] = "Time budget exhausted"
+            return result
+        schema, provenance, urls = generate(product, urls, crawl, pages, deadline)
+        result.update(schema=schema, provenance=provenance, urls=urls, error=None if schema else "No schema extracted")
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Copy the caller's context per task so the job's perf recorder sees the workers' spans
+        futures = {
+            pool.submit(contextvars.copy_context().run, run, category, product): (category, product)
+            for category, product in products
+        }
+        for future in as_completed(futures):
+            category, product = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                logger.warning("Catalog batch failed for %s: %s", product["brandName"], e)
+                yield _result(category, product, error=str(e))
+
+
+def _filled(value):
+    if isinstance(value, dict):
+        return any(_filled(item) for item in value.values())
+    if isinstance(value, list):
+        return any(item not in EMPTY_VALUES for item in value)
+    return value not in EMPTY_VALUES
+
+
+def comparison(results):
+    """Side-by-side table of the schemas in `results`, one row per field.
+
+    The first row holds each product's completeness (the share of fields it
+    fills); every field row gives that field's completeness across products
+    followed by each product's value.
+    """
+    schemas = {result["brandName"]: result["schema"] for result in results if result["schema"]}
+    fields = list(dict.fromkeys(field for schema in schemas.values() for field in schema))
+    if not fields:
+        return []
+    filled = {brand: {field for field in fields if _filled(schema.get(field))} for brand, schema in schemas.items()}
+    rows = [{"field": "Completeness", "completeness": None,
+             **{brand: f"{len(filled[brand]) / len(fields):.0%}" for brand in schemas}}]
+    cells = {brand: exports.flatten(schema) for brand, schema in schemas.items()}
+    for field in fields:
+        share = sum(field in filled[brand] for brand in schemas) / len(schemas)
+        row = {"field": field, "completeness": f"{share:.0%}"}
+        for brand in schemas:
+            row[brand] = cells[brand].get(field) if field in filled[brand] else None
+        rows.append(row)
+    return rows
@@ -0,0 +1,129 @@
+"""Bulk clinical trial extraction.
+
+NCT IDs are collected from a search-results page, pasted text or an
+uploaded CSV, then extracted concurrently on a worker pool. Requests to
+each host are throttled through the shared per-host politeness
+policies, so adding workers raises throughput without hammering one site.
+"""
+import io
+import os
+import csv
+import json
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse, parse_qs, urlencode
+
+import http_cache
+import ct_extract
+import politeness
+
+logger = logging.getLogger(__name__)
+
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 8))
+STUDY_URL = "https://clinicaltrials.gov/study/{}"
+STUDIES_API = "https://clinicaltrials.gov/api/v2/studies"
+
+# Search page parameters and their API v2 equivalents
+SEARCH_PARAMS = {
+    "term": "query.term",
+    "cond": "query.cond",
+    "intr": "query.intr",
+    "spons": "query.spons",
+    "locn": "query.locn",
+    "titles": "query.titles",
+    "outc": "query.outc",
+}
+
+
+def unique_ids(ids):
+    """Deduplicate NCT IDs, keeping first-seen order."""
+    return list(dict.fromkeys(nct_id.upper() for nct_id in ids))
+
+
+def nct_ids_from_text(text):
+    return unique_ids(ct_extract.NCT_RE.findall(text.upper()))
+
+
+def nct_ids_from_csv(fileobj):
+    """Collect NCT IDs from every cell of an uploaded CSV (bytes or text)."""
+    data = fileobj.read()
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig", errors="replace")
+    ids = []
+    for row in csv.reader(io.StringIO(data)):
+        for cell in row:
+            ids.extend(ct_extract.NCT_RE.findall(cell.upper()))
+    return unique_ids(ids)
+
+
+def nct_ids_from_search(url, limit=1000):
+    """Collect NCT IDs from a search-results URL.
+
+    ClinicalTrials.gov search pages are rendered client-side, so their query
+    is replayed against the public API; any other page is scanned for IDs.
+    """
+    parsed = urlparse(url)
+    if "clinicaltrials.gov" not in parsed.netloc or not parsed.path.startswith("/search"):
+        politeness.policy_for(url).wait()
+        return nct_ids_from_text(http_cache.cached_get(url).text)[:limit]
+
+    query = parse_qs(parsed.query)
+    params = {api: query[name][0] for name, api in SEARCH_PARAMS.items() if query.get(name, [""])[0]}
+    params.update({"fields": "NCTId", "pageSize": min(limit, 1000)})
+
+    ids = []
+    while len(ids) < limit:
+        api_url = f"{STUDIES_API}?{urlencode(params)}"
+        politeness.policy_for(api_url).wait()
+        data = json.loads(http_cache.cached_get(api_url).text)
+        for study in data.get("studies", []):
+            ids.append(study["protocolSection"]["identificationModule"]["nctId"])
+        if not data.get("nextPageToken"):
+            break
+        params["pageToken"] = data["nextPageToken"]
+    return unique_ids(ids)[:limit]
+
+
+def _extract(nct_id, depth, max_pages, catalog):
+    return ct_extract.extract_trial(STUDY_URL.format(nct_id), depth=depth, max_pages=max_pages, catalog=catalog)
+
+
+def iter_batch(nct_ids, depth=1, max_pages=1, workers=BATCH_WORKERS, catalog=None):
+    """Extract trials concurrently, yielding (nct_id, schema, error) as each one finishes.
+
+    Closing the generator early cancels the trials not yet started, so only
+    the ones already running are waited for.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Copy the caller's context per task so the job's perf recorder sees the workers' spans
+        futures = {
+            pool.submit(contextvars.copy_context().run, _extract, nct_id, depth, max_pages, catalog): nct_id
+            for nct_id in nct_ids
+        }
+        try:
+            for future in as_completed(futures):
+                nct_id = futures[future]
+                try:
+                    schema = future.result()
+                    yield nct_id, schema, None if schema else "Failed to fetch trial page"
+                except Exception as e:
+                    logger.warning("Batch extraction failed for %s: %s", nct_id, e)
+                    yield nct_id, None, str(e)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def flatten(schema):
+    """Flatten a CT_SCHEMA record into a single table row."""
+    row = {}
+    for key, value in schema.items():
+        if key == "eligibilityCriteria":
+            row["inclusionCriteria"] = "; ".join(value.get("inclusion", []))
+            row["exclusionCriteria"] = "; ".join(value.get("exclusion", []))
+        elif isinstance(value, list):
+            row[key] = "; ".join(value)
+        else:
+            row[key] = value
+    return row
+
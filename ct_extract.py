@@ -0,0 +1,195 @@
+"""Section-indexed clinical trial extraction.
+
+A trial page is parsed once, rendered to markdown and segmented once into labelled
+sections (conditions, interventions, outcome measures, eligibility,
+locations). Each field extractor is a precompiled, line-anchored pattern
+run only against the section it belongs to, so extraction time grows
+linearly with page size. Linked trial sub-pages are followed up to the
+requested depth and page budget and merged into one CT_SCHEMA record.
+"""
+import re
+import copy
+from functools import partial
+
+import perf
+import product_matcher
+import search_index
+from async_crawler import AsyncCrawler
+from page_model import ParsedPage
+from schema_merge import SchemaMerger
+
+CT_SCHEMA = {
+    "productName": None,
+    "genericName": None,
+    "studyType": None,
+    "phase": None,
+    "conditions": [],
+    "interventions": [],
+    "primaryOutcomes": [],
+    "secondaryOutcomes": [],
+    "eligibilityCriteria": {
+        "inclusion": [],
+        "exclusion": []
+    },
+    "enrollmentCount": None,
+    "studyStart": None,
+    "studyCompletion": None,
+    "locations": [],
+    "sponsor": None,
+    "NCTId": None,
+    "status": None
+}
+
+# Section labels, checked in order; the first alias that matches a heading wins
+SECTION_ALIASES = [
+    ("primaryOutcomes", r"primary (?:outcome|endpoint)s?(?: measures?)?"),
+    ("secondaryOutcomes", r"secondary (?:outcome|endpoint)s?(?: measures?)?"),
+    ("outcomes", r"outcome measures?"),
+    ("inclusion", r"inclusion criteria"),
+    ("exclusion", r"exclusion criteria"),
+    ("eligibility", r"eligibility(?: criteria)?|participation criteria"),
+    ("conditions", r"conditions?(?: or diseases?)?|diseases?"),
+    ("interventions", r"interventions?(?:/treatments?)?|arms and interventions|arms/interventions"),
+    ("locations", r"(?:study |contacts and )?locations?"),
+]
+
+_SECTION_NAMES = [name for name, _ in SECTION_ALIASES]
+HEADING_RE = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]*)?(?:\*\*)?(?:"
+    + "|".join(f"(?P<{name}>{alias})" for name, alias in SECTION_ALIASES)
+    + r")(?:\*\*)?(?:[ \t]*:(?:\*\*)?[ \t]*(?P<rest>.*?))?[ \t]*(?:\*\*)?$",
+    re.IGNORECASE,
+)
+GENERIC_HEADING_RE = re.compile(r"^[ \t]*#{1,6}[ \t]+\S")
+BULLET_RE = re.compile(r"^[ \t]*(?:[*\-•+]|\d+[.)])[ \t]+")
+
+NCT_RE = re.compile(r"\bNCT\d{8}\b")
+PHASE_RE = re.compile(r"\bPhase (?:I{1,3}/I{1,3}|[1-4]/[1-4]|I{1,3}V?|[1-4])\b")
+STATUS_RE = re.compile(
+    r"\b(?:Active, not recruiting|Not yet recruiting|Enrolling by invitation|Recruiting|Completed|Withdrawn|Terminated|Suspended)\b"
+)
+_DATE = r"([A-Za-z]+ \d{1,2}, \d{4}|\d{1,2} [A-Za-z]+ \d{4}|[A-Za-z]+ \d{4}|\d{4}-\d{2}-\d{2})"
+FIELD_RES = {
+    "enrollmentCount": re.compile(r"^[ \t*]*(?:Enrollment|Participants)[^\n:]{0,40}:[ \t*]*(\d[\d,]*)", re.M | re.I),
+    "studyStart": re.compile(r"^[ \t*]*(?:Study Start|Start Date)[^\n:]{0,40}:[ \t*]*" + _DATE, re.M | re.I),
+    "studyCompletion": re.compile(r"^[ \t*]*(?:Study Completion|Completion Date)[^\n:]{0,40}:[ \t*]*" + _DATE, re.M | re.I),
+    "sponsor": re.compile(r"^[ \t*]*(?:Sponsor|Responsible Party)[ \t*]*:[ \t*]*([^,;\n\r]+)", re.M | re.I),
+    "studyType": re.compile(r"^[ \t*]*Study Type[ \t*]*:[ \t*]*([A-Za-z ]+)", re.M | re.I),
+}
+
+
+def segment(content):
+    """Split content into {section: text} in one pass over its lines.
+
+    Text outside any recognised section is collected under "overview".
+    """
+    sections = {"overview": []}
+    current = "overview"
+    for line in content.splitlines():
+        match = HEADING_RE.match(line)
+        if match:
+            current = next(name for name in _SECTION_NAMES if match.group(name))
+            sections.setdefault(current, [])
+            rest = (match.group("rest") or "").strip(" *")
+            if rest:
+                sections[current].append(rest)
+        elif GENERIC_HEADING_RE.match(line):
+            current = "overview"
+            sections[current].append(line)
+        else:
+            sections[current].append(line)
+    return {name: "\n".join(lines) for name, lines in sections.items()}
+
+
+def split_items(text):
+    """Turn a section body into list items, one per bullet or line."""
+    items = []
+    for line in text.splitlines():
+        item = BULLET_RE.sub("", line).strip(" *\t")
+        if item and len(item) > 1:
+            items.append(item)
+    return items
+
+
+def extract_page(page, catalog=None):
+    """Extract a CT_SCHEMA record from a single ParsedPage."""
+    content = page.render_markdown(ignore_links=True)
+    with perf.span("extract", page.url):
+        return extract_content(page.url, content, catalog)
+
+
+def extract_content(url, content, catalog=None):
+    """Extract a CT_SCHEMA record from a page's link-free markdown."""
+    schema = copy.deepcopy(CT_SCHEMA)
+    sections = segment(content)
+
+    nct_match = NCT_RE.search(content)
+    if nct_match:
+        schema["NCTId"] = nct_match.group(0)
+    phase_match = PHASE_RE.search(content)
+    if phase_match:
+        schema["phase"] = phase_match.group(0)
+    status_match = STATUS_RE.search(content)
+    if status_match:
+        schema["status"] = status_match.group(0)
+
+    for field, pattern in FIELD_RES.items():
+        match = pattern.search(content)
+        if match:
+            schema[field] = match.group(1).strip()
+
+    for field in ("conditions", "interventions", "primaryOutcomes", "secondaryOutcomes", "locations"):
+        if field in sections:
+            schema[field] = split_items(sections[field])
+    if not schema["primaryOutcomes"] and "outcomes" in sections:
+        schema["primaryOutcomes"] = split_items(sections["outcomes"])
+
+    for field in ("inclusion", "exclusion"):
+        if field in sections:
+            schema["eligibilityCriteria"][field] = split_items(sections[field])
+    if "eligibility" in sections and not schema["eligibilityCriteria"]["inclusion"]:
+        schema["eligibilityCriteria"]["inclusion"] = split_items(sections["eligibility"])
+
+    # For ClinicalTrials.gov URLs, try to extract if a catalog product is being studied
+    if catalog and "clinicaltrials.gov" in url.lower():
+        mentions = product_matcher.find_products(content, catalog)
+        if mentions:
+            schema["productName"] = mentions[0]["brandName"]
+            schema["genericName"] = mentions[0]["genericName"]
+
+    return schema
+
+
+def extract_trial(url, depth=2, max_pages=5, catalog=None, on_page=None, merger=None):
+    """Extract a trial record from `url` and its linked trial sub-pages.
+
+    `on_page`, if given, is called with each page record as it is crawled.
+    Pass a SchemaMerger as `merger` to read the provenance of each value.
+    Returns None if the starting page cannot be fetched.
+    """
+
+    def process_page(page_url, response):
+        page = ParsedPage.from_response(page_url, response)
+        # Already extracted in a parse worker unless the page was parsed in-thread
+        schema = page.extracted if page.extracted is not None else extract_page(page, catalog)
+        # Only follow sub-pages of the same trial (results, history, tabs)
+        nct_match = NCT_RE.search(page_url)
+        nct_id = nct_match.group(0) if nct_match else schema["NCTId"]
+        links = [link for link in page.internal_links if nct_id and nct_id in link]
+        return schema, links
+
+    # Each page is folded in as soon as it is crawled
+    merger = merger or SchemaMerger(CT_SCHEMA)
+    first = None
+    crawler = AsyncCrawler(prerender=(), extract=partial(extract_page, catalog=catalog))
+    for page in crawler.iter_crawl(url, depth=depth, max_pages=max_pages, process_page=process_page):
+        first = first or page
+        if page["data"]:
+            merger.add(page["data"], page["url"])
+        if on_page:
+            on_page(page)
+    if first is None or first["data"] is None:
+        return None
+    schema = merger.result()
+    search_index.get_index().add_schema("trial", url, schema, product=schema["productName"], title=schema["NCTId"])
+    return schema
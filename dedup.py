@@ -0,0 +1,89 @@
+"""Near-duplicate page detection with SimHash.
+
+Each page's cleaned main text is reduced to a 64-bit SimHash over word
+shingles. Fingerprints are stored in a banded index: the 64 bits are split
+into BANDS blocks, and two fingerprints within MAX_DISTANCE bits of each
+other are guaranteed to share at least one identical block, so a lookup
+only compares against the handful of pages in matching buckets.
+"""
+import re
+import hashlib
+import threading
+from collections import Counter
+
+SHINGLE_SIZE = 3
+MAX_DISTANCE = 3
+BANDS = MAX_DISTANCE + 1
+BAND_BITS = 64 // BANDS
+MIN_WORDS = 20
+WORD_RE = re.compile(r"\w+")
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """Return the 64-bit SimHash of `text`, or None if it is too short to judge."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = Counter(
+        " ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)
+    )
+    weights = [0] * 64
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(64):
+            if value >> bit & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class DedupIndex:
+    """Remembers page fingerprints and reports near-duplicates of pages already seen."""
+
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._bands = [{} for _ in range(BANDS)]
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    def _keys(self, fingerprint):
+        mask = (1 << BAND_BITS) - 1
+        return [(fingerprint >> (band * BAND_BITS)) & mask for band in range(BANDS)]
+
+    def check(self, url, text):
+        """Return the URL this page duplicates, or None after recording it as new."""
+        return self.check_fingerprint(url, simhash(text))
+
+    def check_fingerprint(self, url, fingerprint):
+        """check() for a SimHash computed elsewhere, such as in a parse worker."""
+        with self._lock:
+            self.checked += 1
+            if fingerprint is None:
+                return None
+            keys = self._keys(fingerprint)
+            for band, key in enumerate(keys):
+                for other, other_url in self._bands[band].get(key, ()):
+                    if distance(fingerprint, other) <= self.max_distance:
+                        self.duplicates += 1
+                        return other_url
+            for band, key in enumerate(keys):
+                self._bands[band].setdefault(key, []).append((fingerprint, url))
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "duplicates": self.duplicates,
+                "dedupRatio": round(self.duplicates / self.checked, 3) if self.checked else 0.0,
+            }
@@ -0,0 +1,84 @@
+"""Compressed exports of crawl results and schemas.
+
+Exports are serialised only when requested, streamed through gzip into a
+temporary file and handed back compressed, so a large multi-page result
+is never built as one string or pushed to the browser ahead of a
+download.
+"""
+import io
+import csv
+import gzip
+import json
+import tempfile
+
+FORMATS = {
+    "json": ("json.gz", "application/gzip"),
+    "ndjson": ("ndjson.gz", "application/gzip"),
+    "csv": ("csv.gz", "application/gzip"),
+}
+COMPRESS_LEVEL = 6
+
+
+def records(data):
+    """Rows for NDJSON/CSV: list items, a result's "pages", or the object itself."""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and isinstance(data.get("pages"), list):
+        return data["pages"]
+    return [data]
+
+
+def flatten(record):
+    """Default CSV row: lists of strings joined, other nested values as JSON."""
+    row = {}
+    for key, value in record.items():
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            row[key] = "; ".join(value)
+        elif isinstance(value, (dict, list)):
+            row[key] = json.dumps(value)
+        else:
+            row[key] = value
+    return row
+
+
+def write_json(data, out):
+    for chunk in json.JSONEncoder(indent=2).iterencode(data):
+        out.write(chunk)
+
+
+def write_ndjson(data, out):
+    for record in records(data):
+        out.write(json.dumps(record))
+        out.write("\n")
+
+
+def write_csv(data, out, row=flatten):
+    rows = records(data)
+    fieldnames = {}
+    for record in rows:
+        fieldnames.update(dict.fromkeys(row(record)))
+    writer = csv.DictWriter(out, fieldnames=list(fieldnames), extrasaction="ignore")
+    writer.writeheader()
+    for record in rows:
+        writer.writerow(row(record))
+
+
+WRITERS = {"json": write_json, "ndjson": write_ndjson, "csv": write_csv}
+
+
+def export(data, fmt, **options):
+    """Write `data` as gzip-compressed `fmt` and return the compressed bytes as a BytesIO.
+
+    The export is streamed through a temp file, which is closed (and so
+    deleted) before returning; only the compressed output is held in memory.
+    """
+    with tempfile.TemporaryFile() as spool:
+        with gzip.GzipFile(fileobj=spool, mode="wb", compresslevel=COMPRESS_LEVEL) as compressed:
+            with io.TextIOWrapper(compressed, encoding="utf-8", newline="") as out:
+                WRITERS[fmt](data, out, **options)
+        spool.seek(0)
+        return io.BytesIO(spool.read())
+
+
+def filename(basename, fmt):
+    return f"{basename}.{FORMATS[fmt][0]}"
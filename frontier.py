@@ -0,0 +1,213 @@
+"""Priority URL frontier for focused crawls.
+
+URLs are canonicalised (tracking and session parameters, fragments,
+default ports and host case removed) before they are checked against a
+Bloom-filter seen-set, so large crawls remember hundreds of thousands of
+URLs in a few hundred kilobytes. Links are then scheduled by a score that
+puts prescribing information, safety, dosing and PI PDFs ahead of generic
+pages and pushes footer boilerplate to the back.
+"""
+import re
+import heapq
+import math
+import hashlib
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode, unquote
+
+TRACKING_PARAMS = {
+    "gclid", "fbclid", "msclkid", "dclid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl", "igshid",
+    "ref", "referrer", "source", "cmpid", "cid", "s_kwcid", "trk", "hsctatracking",
+}
+SESSION_PARAMS = {"sessionid", "session_id", "sid", "jsessionid", "phpsessid", "aspsessionid", "cfid", "cftoken"}
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_", "hsa_")
+SESSION_PATH_RE = re.compile(r";(?:jsessionid|phpsessid|sid)=[^/?#]*", re.I)
+PERCENT_RE = re.compile(r"%[0-9a-fA-F]{2}")
+INDEX_PAGE_RE = re.compile(r"/(?:index|default)\.(?:html?|php|aspx?)$", re.I)
+LOCALE_RE = re.compile(
+    r"^/((?:en|es|fr|de|it|pt|ja|zh|ko|nl|sv|da|fi|no|pl|ru|tr|ar|he)(?:[-_][a-z]{2})?|[a-z]{2}[-_][a-z]{2})(?:/|$)",
+    re.I,
+)
+
+# Higher weight = crawled sooner; matched against the URL path and anchor text
+PRIORITY_TERMS = [
+    (10, re.compile(r"prescribing[-_ ]?information|full[-_ ]?pi\b|\bpi\.pdf|package[-_ ]?insert|\bpi\b|\buspi\b", re.I)),
+    (8, re.compile(r"safety|boxed[-_ ]?warning|warnings?|\bisi\b|side[-_ ]?effects?|adverse", re.I)),
+    (7, re.compile(r"dosing|dosage|administration|\bdose\b", re.I)),
+    (5, re.compile(r"indications?|mechanism|\bmoa\b|efficacy|clinical[-_ ]?(?:trials?|data|studies)", re.I)),
+    (3, re.compile(r"patient[-_ ]?(?:support|resources?)|medication[-_ ]?guide|hcp", re.I)),
+]
+# Whole words or path segments only, counting hyphenated names as one word, so
+# "press" and "media" do not match /depression, /blood-pressure or /media-guide
+LOW_PRIORITY = re.compile(
+    r"(?<![\w-])(?:privacy(?:[-_ ](?:policy|notice))?|terms(?:[-_ ](?:of[-_ ](?:use|service)|and[-_ ]conditions))?|"
+    r"cookies?(?:[-_ ](?:policy|settings|preferences))?|legal(?:[-_ ](?:notice|disclaimer))?|accessibility|sitemap|"
+    r"contact(?:[-_ ]us)?|careers?|jobs|log[-_ ]?in|sign[-_ ]?in|register|newsroom|press(?:[-_ ](?:releases?|room))?|"
+    r"media(?:[-_ ](?:center|centre|room|kit))?|investors?(?:[-_ ]relations)?|social(?:[-_ ]media)?|"
+    r"facebook|twitter|linkedin|youtube)(?![\w-])",
+    re.I,
+)
+
+
+def _normalise_percent(text):
+    return PERCENT_RE.sub(lambda match: match.group(0).upper(), text)
+
+
+def canonicalize(url):
+    """Return the fetchable canonical form of a URL.
+
+    Lower-cases scheme and host, drops default ports, fragments, tracking and
+    session parameters, and sorts the remaining query parameters. Path case is
+    preserved because servers treat it as significant.
+    """
+    parts = urlparse(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    netloc = parts.netloc.lower()
+    if scheme == "http" and netloc.endswith(":80"):
+        netloc = netloc[:-3]
+    elif scheme == "https" and netloc.endswith(":443"):
+        netloc = netloc[:-4]
+    path = SESSION_PATH_RE.sub("", parts.path) or "/"
+    path = _normalise_percent(path)
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS
+        and key.lower() not in SESSION_PARAMS
+        and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    return urlunparse((scheme, netloc, path, "", urlencode(sorted(query)), ""))
+
+
+def dedup_key(url):
+    """Key for the seen-set: canonical form without trailing slashes or index pages."""
+    canonical = canonicalize(url)
+    parts = urlparse(canonical)
+    path = INDEX_PAGE_RE.sub("/", parts.path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+    return urlunparse((parts.scheme, parts.netloc, path, "", parts.query, ""))
+
+
+class _BloomSlice:
+    """Fixed-size Bloom filter sized for `capacity` items at `error_rate`."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, first, second):
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, hashes):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(*hashes))
+
+    def add(self, hashes):
+        for pos in self._positions(*hashes):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+
+class BloomFilter:
+    """Probabilistic set with false positives at roughly `error_rate`, however many items it holds.
+
+    `capacity` is only the first slice's size: when a slice is full a
+    larger one with a tighter error rate is added (a scalable Bloom
+    filter), so one huge index page cannot saturate the set and start
+    dropping new links as already seen.
+    """
+
+    GROWTH = 4
+    TIGHTENING = 0.5
+
+    def __init__(self, capacity=100000, error_rate=0.0001):
+        self.count = 0
+        # Slice error rates form a geometric series that sums to error_rate
+        self._next_error = error_rate * (1 - self.TIGHTENING)
+        self.slices = []
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        self.slices.append(_BloomSlice(capacity, self._next_error))
+        self._next_error *= self.TIGHTENING
+
+    @staticmethod
+    def _hashes(item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def __contains__(self, item):
+        hashes = self._hashes(item)
+        return any(hashes in bloom for bloom in self.slices)
+
+    def add(self, item):
+        """Add an item; return False if it was (probably) already present."""
+        hashes = self._hashes(item)
+        if any(hashes in bloom for bloom in self.slices):
+            return False
+        current = self.slices[-1]
+        if current.count >= current.capacity:
+            self._grow(current.capacity * self.GROWTH)
+            current = self.slices[-1]
+        current.add(hashes)
+        self.count += 1
+        return True
+
+    def __len__(self):
+        return self.count
+
+
+def score(url, anchor_text="", home_locale=None):
+    """Priority score for a link: higher is crawled sooner, 0 is a generic page."""
+    parts = urlparse(url)
+    target = f"{unquote(parts.path)} {parts.query} {anchor_text}"
+    value = 0
+    for weight, pattern in PRIORITY_TERMS:
+        if pattern.search(target):
+            value = max(value, weight)
+    if parts.path.lower().endswith(".pdf"):
+        value += 2
+    if LOW_PRIORITY.search(target):
+        value -= 5
+    locale = LOCALE_RE.match(parts.path)
+    if locale and home_locale is not None and locale.group(1).lower() != home_locale:
+        value -= 3
+    return value
+
+
+class Frontier:
+    """Priority queue of (url, depth) with canonicalisation and a compact seen-set."""
+
+    def __init__(self, start_url, max_depth, capacity=100000, prioritize=True):
+        self.max_depth = max_depth
+        self.prioritize = prioritize
+        self.seen = BloomFilter(capacity)
+        self._heap = []
+        self._counter = 0
+        locale = LOCALE_RE.match(urlparse(start_url).path)
+        # None when the start URL has no locale, so no locale is penalised
+        self.home_locale = locale.group(1).lower() if locale else None
+        self.push(start_url, 1)
+
+    def push(self, url, depth, anchor_text=""):
+        """Queue a URL unless it is too deep or already seen; return whether it was queued."""
+        if depth > self.max_depth:
+            return False
+        if not self.seen.add(dedup_key(url)):
+            return False
+        priority = score(url, anchor_text, self.home_locale) if self.prioritize else 0
+        heapq.heappush(self._heap, (-priority, depth, self._counter, canonicalize(url)))
+        self._counter += 1
+        return True
+
+    def pop(self, count=1):
+        """Remove and return up to `count` (url, depth) pairs, best first."""
+        items = []
+        while self._heap and len(items) < count:
+            _, depth, _, url = heapq.heappop(self._heap)
+            items.append((url, depth))
+        return items
+
+    def __len__(self):
+        return len(self._heap)
@@ -0,0 +1,316 @@
+"""Persistent HTTP response cache backed by SQLite.
+
+Responses are keyed by canonical URL. Fresh entries (younger than the TTL)
+are served straight from disk; stale entries are revalidated with
+If-None-Match / If-Modified-Since so an unchanged page costs a 304 instead
+of a full download. The store is kept under a byte budget by evicting the
+least recently used entries.
+
+Live responses are streamed: a caller that only wants some content types
+(the crawler asks for HTML) gets other types and oversized Content-Length
+values rejected from the headers alone, and every body is cut off at
+FETCH_MAX_BYTES while it is read. Transfers are compressed with gzip, or
+brotli when the brotli package is installed.
+"""
+import os
+import re
+import json
+import time
+import codecs
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+import requests
+import urllib3
+
+import perf
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.environ.get("CACHE_PATH", os.path.join(".cache", "http_cache.sqlite3"))
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 3600))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 200 * 1024 * 1024))
+FETCH_MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", 10 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+# Eviction frees down to this share of the budget, so it runs once per ~10% of new bytes rather than on every store
+EVICT_TO = 0.9
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+# gzip and deflate always; br and zstd when brotli / zstandard are installed
+ACCEPT_ENCODING = urllib3.util.make_headers(accept_encoding=True)["accept-encoding"]
+CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+SNIFF_BYTES = 2048
+BOMS = ((codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+
+def canonical_url(url):
+    """Normalise a URL so equivalent spellings share one cache entry.
+
+    Unlike frontier.canonicalize this keeps every query parameter: the
+    request goes to the URL as given, so only spellings of the same
+    request may share an entry.
+    """
+    parts = urlparse(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    netloc = parts.netloc.lower()
+    if scheme == "http" and netloc.endswith(":80"):
+        netloc = netloc[:-3]
+    elif scheme == "https" and netloc.endswith(":443"):
+        netloc = netloc[:-4]
+    path = parts.path or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, path, "", query, ""))
+
+
+def _codec(name):
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def sniff_encoding(headers, content):
+    """The declared charset, else a BOM or <meta charset> near the top of the body, else UTF-8."""
+    declared = CHARSET_RE.search(headers.get("Content-Type", ""))
+    if declared and _codec(declared.group(1)):
+        return _codec(declared.group(1))
+    for bom, name in BOMS:
+        if content.startswith(bom):
+            return name
+    meta = META_CHARSET_RE.search(content[:SNIFF_BYTES])
+    if meta and _codec(meta.group(1).decode("ascii", "ignore")):
+        return _codec(meta.group(1).decode("ascii"))
+    return "utf-8"
+
+
+def rejection(headers, accept=None, max_bytes=FETCH_MAX_BYTES):
+    """Why a response should not be read, judged from its headers alone, or None."""
+    content_type = headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if accept and content_type and content_type not in accept:
+        return f"Skipped {content_type} content"
+    length = headers.get("Content-Length", "")
+    # Content-Length is the encoded size; a compressed body may still decode past the cap
+    if length.isdigit() and int(length) > max_bytes:
+        return f"Skipped {int(length)} byte body (limit {max_bytes})"
+    return None
+
+
+class CachedResponse:
+    """Minimal response object shared by cache hits and live fetches."""
+
+    def __init__(self, url, status_code, headers, content, from_cache=False, skipped=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+        self.content = content or b""
+        self.from_cache = from_cache
+        # Why the body was not read (wrong content type, too large), if it was not
+        self.skipped = skipped
+        self._encoding = None
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400 and not self.skipped
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = sniff_encoding(self.headers, self.content)
+        return self._encoding
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+
+class HttpCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # A cache can lose its last writes on power loss; WAL keeps it consistent without a sync per commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                accessed_at REAL,
+                size INTEGER
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self._conn.commit()
+        # Running size of the stored bodies, kept up to date by _store, _evict and clear
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _lookup(self, key):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT status, headers, body, etag, last_modified, fetched_at FROM responses WHERE url = ?",
+                (key,),
+            ).fetchone()
+
+    def _touch(self, key, refreshed=False):
+        now = time.time()
+        with self._lock:
+            if refreshed:
+                self._conn.execute(
+                    "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, key)
+                )
+            else:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, key))
+            self._conn.commit()
+
+    def _store(self, key, response):
+        headers = dict(response.headers)
+        body = response.content
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE url = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    response.status_code,
+                    json.dumps(headers),
+                    body,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now,
+                    now,
+                    len(body),
+                ),
+            )
+            self._bytes += len(body) - (previous[0] if previous else 0)
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until the store is back under EVICT_TO of the budget.
+        # Called with the lock held; the total is re-read first in case another process shares the file.
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        target = self.max_bytes * EVICT_TO if total > self.max_bytes else total
+        doomed = []
+        for key, size in self._conn.execute("SELECT url, size FROM responses ORDER BY accessed_at"):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", doomed)
+        self._bytes = total
+        if doomed:
+            logger.debug("Evicted %d cached responses", len(doomed))
+
+    def is_fresh(self, url):
+        """Return whether `url` would be served from disk without touching the network."""
+        row = self._lookup(canonical_url(url))
+        return row is not None and time.time() - row[5] < self.ttl
+
+    def get(self, url, session=None, headers=None, timeout=30, accept=None, max_bytes=FETCH_MAX_BYTES):
+        """Fetch a URL, serving fresh entries from disk and revalidating stale ones.
+
+        With `accept` (a tuple of content types), other types come back
+        with `skipped` set and no body, as do bodies over `max_bytes`.
+        """
+        key = canonical_url(url)
+        row = self._lookup(key)
+
+        if row:
+            status, cached_headers, body, etag, last_modified, fetched_at = row
+            cached = CachedResponse(url, status, json.loads(cached_headers), body, from_cache=True)
+            cached.skipped = rejection(cached.headers, accept, max_bytes)
+            if time.time() - fetched_at < self.ttl:
+                with perf.span("cache", url, len(body)):
+                    self._touch(key)
+                return cached
+
+        request_headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        request_headers.update(headers or {})
+        if row:
+            if etag:
+                request_headers["If-None-Match"] = etag
+            if last_modified:
+                request_headers["If-Modified-Since"] = last_modified
+
+        start = time.perf_counter()
+        with (session or requests).get(url, headers=request_headers, timeout=timeout, stream=True) as response:
+            # elapsed runs until the headers are parsed; the body is read after that
+            ttfb = response.elapsed.total_seconds()
+            perf.record("ttfb", url, ttfb, start=start)
+
+            if row and response.status_code == 304:
+                self._touch(key, refreshed=True)
+                return cached
+
+            skipped = rejection(response.headers, accept, max_bytes)
+            body = b""
+            if not skipped:
+                body, skipped = self._read(response, max_bytes)
+            # Bytes on the wire, before decompression
+            perf.record("download", url, max(0.0, time.perf_counter() - start - ttfb), response.raw.tell())
+        if skipped:
+            logger.debug("%s: %s", url, skipped)
+            return CachedResponse(response.url, response.status_code, response.headers, b"", skipped=skipped)
+
+        result = CachedResponse(response.url, response.status_code, response.headers, body)
+        if response.status_code == 200 and "no-store" not in response.headers.get("Cache-Control", ""):
+            self._store(key, result)
+        return result
+
+    @staticmethod
+    def _read(response, max_bytes):
+        """Read a streamed body, giving up as soon as it decodes past `max_bytes`."""
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                return b"", f"Body exceeded {max_bytes} bytes"
+            chunks.append(chunk)
+        return b"".join(chunks), None
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "maxBytes": self.max_bytes, "ttl": self.ttl}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._bytes = 0
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, creating it on first use."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = HttpCache()
+        return _default_cache
+
+
+def cached_get(url, session=None, headers=None, timeout=30, max_bytes=FETCH_MAX_BYTES):
+    return get_cache().get(url, session=session, headers=headers, timeout=timeout, max_bytes=max_bytes)
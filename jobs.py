@@ -0,0 +1,140 @@
+"""Background job queue for crawl and extraction work.
+
+Jobs are queued on a shared thread pool with a fixed concurrency cap.
+Each job records its status, latest progress event, result and error so
+callers can return a job id immediately and poll for completion.
+Identical requests submitted while a job is still running can be
+collapsed onto that job (singleflight) with `submit_once`.
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import perf
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", 100))
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", 3600))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind, params, key=None, profile=False):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.kind = kind
+        self.params = params
+        self.profile = profile
+        # perf.Recorder with the run's per-stage timings
+        self.perf = None
+        self.status = "queued"
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobManager:
+    def __init__(self, workers=JOB_WORKERS, max_queued=MAX_QUEUED_JOBS, retention=JOB_RETENTION):
+        self.max_queued = max_queued
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl-job")
+        self._jobs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, profile=False, **params):
+        """Queue `fn(job, **params)` and return its Job straight away.
+
+        The function's return value becomes `job.result`; it may update
+        `job.progress` as it runs. Stage timings are recorded in `job.perf`,
+        and `profile=True` also runs the job under cProfile.
+        """
+        with self._lock:
+            job = self._enqueue(kind, fn, params, profile=profile)
+        return job
+
+    def submit_once(self, key, kind, fn, profile=False, reuse=False, **params):
+        """Like submit(), but return the in-flight job for `key` if there is one.
+
+        With `reuse`, a job for `key` that finished successfully and is still
+        retained is returned too, so its result is not computed again.
+        """
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None and reuse and job.status == "done" and job.finished >= time.time() - self.retention:
+                return job
+            if job is None or job.done:
+                job = self._enqueue(kind, fn, params, key, profile)
+                self._inflight[key] = job
+        return job
+
+    def _enqueue(self, kind, fn, params, key=None, profile=False):
+        self._prune()
+        pending = sum(1 for job in self._jobs.values() if not job.done)
+        if pending >= self.max_queued:
+            raise QueueFullError(f"{pending} jobs already pending")
+        job = Job(kind, params, key, profile)
+        self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _prune(self):
+        # Forget finished jobs once they are older than the retention window
+        cutoff = time.time() - self.retention
+        for job_id in [job.id for job in self._jobs.values() if job.done and job.finished < cutoff]:
+            job = self._jobs.pop(job_id)
+            if job.key is not None and self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+
+    def _run(self, job, fn):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            with perf.recording(profile=job.profile) as recorder:
+                job.perf = recorder
+                result = fn(job, **job.params)
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.error = str(e)
+            job.finished = time.time()
+            job.status = "failed"
+        else:
+            job.result = result
+            job.finished = time.time()
+            job.status = "done"
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
@@ -0,0 +1,116 @@
+"""Concurrent liveness checks for suggested and generated links.
+
+Every candidate URL is checked in parallel with a short-timeout HEAD
+request over the shared keep-alive pool, falling back to a streamed GET
+(body not read) for servers that reject HEAD. Results are cached per URL
+for LINK_CHECK_TTL seconds, so a page of suggestions costs about as much as
+its slowest link, once.
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from async_crawler import _pool
+
+logger = logging.getLogger(__name__)
+
+LINK_CHECK_TTL = int(os.environ.get("LINK_CHECK_TTL", 3600))
+LINK_CHECK_TIMEOUT = float(os.environ.get("LINK_CHECK_TIMEOUT", 5))
+LINK_CHECK_WORKERS = int(os.environ.get("LINK_CHECK_WORKERS", 32))
+# Servers that answer these to HEAD often serve GET fine
+HEAD_REJECTED = (403, 405, 501)
+# The page exists but will not serve us; not a dead link
+ALIVE_STATUSES = (401, 403, 429)
+
+
+class LinkChecker:
+    def __init__(self, ttl=LINK_CHECK_TTL, timeout=LINK_CHECK_TIMEOUT, workers=LINK_CHECK_WORKERS, pool=None):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.workers = workers
+        self.pool = pool or _pool
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _request(self, method, url):
+        session = self.pool.session_for(url)
+        response = session.request(method, url, allow_redirects=True, timeout=self.timeout, stream=method == "GET")
+        response.close()
+        return response
+
+    def check(self, url):
+        """Check one URL, returning {url, alive, status, finalUrl, latencyMs, error}."""
+        with self._lock:
+            cached = self._cache.get(url)
+        if cached and time.time() - cached[0] < self.ttl:
+            return cached[1]
+
+        result = {"url": url, "alive": False, "status": None, "finalUrl": None, "latencyMs": None, "error": None}
+        start = time.perf_counter()
+        try:
+            response = self._request("HEAD", url)
+            if response.status_code in HEAD_REJECTED:
+                response = self._request("GET", url)
+            result["status"] = response.status_code
+            result["finalUrl"] = response.url
+            result["alive"] = response.status_code < 400 or response.status_code in ALIVE_STATUSES
+        except requests.RequestException as e:
+            result["error"] = str(e)
+        result["latencyMs"] = round((time.perf_counter() - start) * 1000)
+
+        with self._lock:
+            self._cache[url] = (time.time(), result)
+        return result
+
+    def check_all(self, urls):
+        """Check URLs concurrently; return {url: result} in the order given."""
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(urls))) as executor:
+            # Each check runs in a copy of the caller's context, so its timings reach the caller's recorder
+            futures = [executor.submit(contextvars.copy_context().run, self.check, url) for url in urls]
+            return {url: future.result() for url, future in zip(urls, futures)}
+
+    def filter_alive(self, links):
+        """Annotate link dicts ({"url": ...}) with their check result and drop dead ones."""
+        return self._annotate(links, self.check_all(link["url"] for link in links))
+
+    def filter_groups(self, groups):
+        """filter_alive() over {category: [links]} in one concurrent pass; empty categories are dropped."""
+        results = self.check_all(link["url"] for links in groups.values() for link in links)
+        filtered = {}
+        for category, links in groups.items():
+            alive = self._annotate(links, results)
+            if alive:
+                filtered[category] = alive
+        return filtered
+
+    @staticmethod
+    def _annotate(links, results):
+        alive = []
+        for link in links:
+            result = results[link["url"]]
+            if result["alive"]:
+                alive.append(dict(link, status=result["status"], finalUrl=result["finalUrl"], latencyMs=result["latencyMs"]))
+            else:
+                logger.debug("Hiding dead link %s (%s)", link["url"], result["error"] or result["status"])
+        return alive
+
+
+_default_checker = None
+_default_lock = threading.Lock()
+
+
+def get_checker():
+    """Return the process-wide checker, whose cache is shared by every session."""
+    global _default_checker
+    with _default_lock:
+        if _default_checker is None:
+            _default_checker = LinkChecker()
+        return _default_checker
@@ -0,0 +1,82 @@
+"""Streaming llms.txt generation.
+
+Pages flow through fetch -> clean -> convert -> append one at a time: each
+page's section is written to the output file as soon as it is processed
+and then dropped, so memory stays flat however deep the crawl goes.
+`generate()` yields progress events so callers can report on the run.
+"""
+import os
+import logging
+from datetime import datetime
+from urllib.parse import urlparse
+
+import search_index
+from async_crawler import AsyncCrawler, USER_AGENT
+from dedup import DedupIndex
+from politeness import RESPECT_ROBOTS_TXT
+from page_model import ParsedPage
+
+logger = logging.getLogger(__name__)
+
+LLMS_MAX_PAGES = int(os.environ.get("LLMS_MAX_PAGES", 500))
+OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "output")
+
+def render_section(url, title, status, markdown, respect_robots=True):
+    return (
+        f"## {title or url}\n\n"
+        f"Source: {url}\n"
+        f"Crawl Date: {datetime.now().isoformat(timespec='seconds')}\n"
+        f"User Agent: {USER_AGENT}\n"
+        f"Robots.txt: {'Respected' if respect_robots else 'Ignored'}\n"
+        f"Status: {status}\n\n"
+        f"{markdown}\n\n"
+    )
+
+
+def output_path_for(url):
+    host = urlparse(url).netloc.replace(":", "_") or "site"
+    return os.path.join(OUTPUT_DIR, f"{host}_llms.txt")
+
+
+def generate(url, depth=1, max_pages=LLMS_MAX_PAGES, output_path=None, crawler=None, respect_robots=RESPECT_ROBOTS_TXT):
+    """Crawl `url` and stream an llms.txt file to disk, yielding progress events.
+
+    Events are dicts with a "type" of "start", "page", "duplicate", "error"
+    or "done". Near-duplicate pages are left out of the file, and the done
+    event reports the dedup ratio.
+    """
+    output_path = output_path or output_path_for(url)
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    written = 0
+    failed = 0
+    with open(output_path, "w", encoding="utf-8") as output:
+        output.write(f"# {urlparse(url).netloc}\n\n> Generated from {url} on {datetime.now():%Y-%m-%d}\n\n")
+        yield {"type": "start", "url": url, "path": output_path}
+
+        def process_page(page_url, response):
+            page = ParsedPage.from_response(page_url, response)
+            section = render_section(page_url, page.title, page.status_code, page.markdown, respect_robots)
+            search_index.get_index().add_page(page_url, page.title, page.markdown)
+            return section, page.internal_anchors
+
+        crawler = crawler or AsyncCrawler(respect_robots=respect_robots, dedup=DedupIndex())
+        for page in crawler.iter_crawl(url, depth, max_pages, process_page):
+            if page["duplicate_of"]:
+                yield {"type": "duplicate", "url": page["url"], "duplicate_of": page["duplicate_of"]}
+                continue
+            if page["data"] is None:
+                failed += 1
+                yield {"type": "error", "url": page["url"], "error": page["error"]}
+                continue
+            output.write(page["data"])
+            output.flush()
+            written += 1
+            yield {"type": "page", "url": page["url"], "depth": page["depth"], "pages": written, "bytes": output.tell()}
+
+    done = {"type": "done", "path": output_path, "pages": written, "failed": failed}
+    if crawler.dedup is not None:
+        done.update(crawler.dedup.stats())
+    yield done
@@ -0,0 +1,163 @@
+"""Parse-once page model.
+
+A ParsedPage parses a page's HTML a single time and lazily derives
+everything downstream stages need from that one DOM: title, outbound
+links, the cleaned main-content subtree, markdown renderings and plain
+text. Link extraction, cleaning, conversion and schema extraction all
+consume the same object instead of re-parsing or re-flattening the page.
+"""
+import os
+import re
+from urllib.parse import urljoin, urlparse, urldefrag
+
+import html2text
+from bs4 import BeautifulSoup, Comment
+
+import perf
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+
+HTML_PARSER = os.environ.get("HTML_PARSER") or DEFAULT_PARSER
+
+UNWANTED_TAGS = ["script", "style", "noscript", "iframe", "svg", "form", "nav", "footer", "header", "aside"]
+# Matched against whole class tokens and ids, never substrings: "has-cookie-notice" on <body> or a
+# "downloads-section" holding the PI link must survive
+AD_MARKERS = re.compile(
+    r"^(?:ads?|ad-(?:slot|unit|container|wrapper|banner)|advert\w*|sponsored|promo|popup|cookie-(?:banner|consent|notice|bar))$",
+    re.I,
+)
+# Content containers, kept even when they carry an ad-like class
+CONTENT_TAGS = ("html", "body", "main", "article")
+
+
+class ParsedPage:
+    def __init__(self, url, html, status_code=200, parser=HTML_PARSER):
+        self.url = url
+        self.html = html
+        self.status_code = status_code
+        self.parser = parser
+        self._soup = None
+        self._title = None
+        self._links = None
+        self._main = None
+        self._markdown = {}
+        self._text = None
+        # Result of a crawler's `extract` callable when run in a parse worker
+        self.extracted = None
+
+    @classmethod
+    def from_response(cls, url, response, parser=HTML_PARSER):
+        """Parse a response, reusing the page already parsed for it if there is one."""
+        page = getattr(response, "parsed_page", None)
+        if page is None or page.url != url:
+            page = cls(url, response.text, response.status_code, parser)
+            response.parsed_page = page
+        return page
+
+    @classmethod
+    def from_parsed(cls, url, response, parsed):
+        """Rebuild a page from a parse_pool result without parsing it again.
+
+        Only a markdown rendering that the worker did not produce needs the
+        DOM, and that is parsed lazily from the response body as usual.
+        """
+        page = cls(url, response.text, response.status_code)
+        page._title = parsed["title"] or ""
+        page._links = dict(parsed["anchors"])
+        page._markdown = dict(parsed["markdown"])
+        page.extracted = parsed["extracted"]
+        response.parsed_page = page
+        return page
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            with perf.span("parse", self.url, len(self.html)):
+                self._soup = BeautifulSoup(self.html, self.parser)
+        return self._soup
+
+    @property
+    def title(self):
+        if self._title is None:
+            tag = self.soup.title
+            self._title = tag.get_text(strip=True) if tag else ""
+        return self._title or None
+
+    @property
+    def links(self):
+        """Absolute http(s) links in document order, without fragments or repeats."""
+        if self._links is None:
+            links = {}
+            for anchor in self.soup.find_all("a", href=True):
+                link = urldefrag(urljoin(self.url, anchor["href"]))[0]
+                if urlparse(link).scheme in ("http", "https") and link not in links:
+                    links[link] = anchor.get_text(" ", strip=True)
+            self._links = links
+        return list(self._links)
+
+    @property
+    def anchors(self):
+        """(link, anchor text) pairs in document order, first anchor text per link."""
+        self.links
+        return list(self._links.items())
+
+    @property
+    def internal_links(self):
+        host = urlparse(self.url).netloc
+        return [link for link in self.links if urlparse(link).netloc == host]
+
+    @property
+    def internal_anchors(self):
+        host = urlparse(self.url).netloc
+        return [(link, text) for link, text in self.anchors if urlparse(link).netloc == host]
+
+    @property
+    def main(self):
+        """The main-content subtree with scripts, styles, navigation and ads removed.
+
+        Cleaning mutates the DOM, so title and links are captured first.
+        """
+        if self._main is None:
+            self.title
+            self.links
+            soup = self.soup
+            with perf.span("clean", self.url):
+                for tag in soup(UNWANTED_TAGS):
+                    tag.decompose()
+                for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+                    comment.extract()
+                main = soup.find("main") or soup.find("article") or soup.body or soup
+                # Only the content's descendants are candidates, so it and its ancestors always survive
+                for tag in main.find_all(True):
+                    if tag.decomposed or tag.name in CONTENT_TAGS:
+                        continue
+                    markers = list(tag.get("class", [])) + [tag.get("id") or ""]
+                    if any(AD_MARKERS.match(marker) for marker in markers):
+                        tag.decompose()
+                self._main = main
+        return self._main
+
+    def render_markdown(self, ignore_links=False):
+        if ignore_links not in self._markdown:
+            converter = html2text.HTML2Text(baseurl=self.url)
+            converter.body_width = 0
+            converter.ignore_images = True
+            converter.ignore_links = ignore_links
+            main = self.main
+            with perf.span("markdown", self.url):
+                self._markdown[ignore_links] = converter.handle(str(main)).strip()
+        return self._markdown[ignore_links]
+
+    @property
+    def markdown(self):
+        return self.render_markdown()
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.main.get_text("\n", strip=True)
+        return self._text
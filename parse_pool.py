@@ -0,0 +1,86 @@
+"""Process pool for the CPU-bound half of a crawl.
+
+Parsing, cleaning, markdown conversion, SimHash fingerprinting and schema
+extraction are pure Python and hold the GIL, so on the crawl thread they
+serialise with fetching and use one core. AsyncCrawler hands each fetched
+HTML page to this pool instead: the worker gets the raw body bytes and
+returns only what the crawl needs (title, links, markdown, text,
+fingerprint, extracted data), while the crawler fetches the next chunk.
+"""
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import perf
+from dedup import simhash
+from page_model import ParsedPage
+
+logger = logging.getLogger(__name__)
+
+# 0 or 1 keeps all parsing on the crawl thread
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+
+
+def parse_response(url, content, encoding, status_code, prerender=(False,), fingerprint=False, extract=None):
+    """Parse one page in a worker process and return its compact result.
+
+    `prerender` lists the markdown renderings (ignore_links values) to
+    produce, and `fingerprint` adds the SimHash of the main text.
+    `extract`, if given, is a picklable callable run on the ParsedPage.
+    Stage timings are returned as (stage, start, duration, bytes, cpu) so
+    the parent can report them to its own recorder.
+    """
+    with perf.recording() as recorder:
+        page = ParsedPage(url, content.decode(encoding or "utf-8", errors="replace"), status_code)
+        for ignore_links in prerender:
+            page.render_markdown(ignore_links)
+        extracted = extract(page) if extract is not None else None
+        result = {
+            "title": page.title,
+            "anchors": page.anchors,
+            "markdown": dict(page._markdown),
+            "fingerprint": None,
+            "extracted": extracted,
+        }
+        if fingerprint:
+            text = page.text
+            with perf.span("dedup", url):
+                result["fingerprint"] = simhash(text)
+    result["spans"] = [
+        (item["stage"], item["start"] + recorder.origin, item["duration"], item["bytes"], item["cpu"])
+        for item in recorder.spans
+    ]
+    return result
+
+
+def _context():
+    # Crawl jobs run on threads, which makes fork() unsafe; forkserver keeps start-up cheap
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide parse pool, or None when PARSE_WORKERS disables it."""
+    global _default_pool
+    if PARSE_WORKERS <= 1:
+        return None
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=_context())
+        return _default_pool
+
+
+def reset_pool(pool):
+    """Drop `pool` after a worker crash so the next get_pool() starts a fresh one."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is pool:
+            _default_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    logger.warning("Parse pool broke; starting a new one for later pages")
@@ -0,0 +1,246 @@
+"""Per-stage timing and byte counters for crawls.
+
+Instrumented code calls `span(stage, url)` or `record(...)`; the spans go
+to whichever Recorder is active in the current context (set with
+`recording()`), and cost nothing when none is. The context is copied into
+`asyncio.to_thread` workers, so fetches made on other threads still
+report to the run that started them. A Recorder aggregates its spans per
+stage, host and page and exports them as JSON or Chrome trace events.
+
+Network stages come from the connection classes installed by
+`install_connection_timing`: dns, connect (TCP) and tls for new
+connections; ttfb is the request's `elapsed` time, which includes those
+for requests that had to open a connection, and download is the rest.
+"""
+import io
+import json
+import time
+import socket
+import pstats
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+# "pool" is time spent waiting for a parse worker's result (see parse_pool.py)
+STAGES = ("robots", "throttle", "cache", "dns", "connect", "tls", "ttfb", "download", "pool", "parse", "clean",
+          "markdown", "dedup", "extract", "merge", "process")
+PROFILE_LINES = 40
+
+_current = contextvars.ContextVar("perf_recorder", default=None)
+
+
+class Recorder:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def add(self, stage, url, start, duration, nbytes=0, cpu=0.0):
+        host = urlparse(url).netloc.lower() if url and "://" in url else (url or "")
+        with self._lock:
+            self.spans.append({
+                "stage": stage,
+                "url": url if url and "://" in url else None,
+                "host": host,
+                "start": start - self.origin,
+                "duration": duration,
+                "bytes": nbytes,
+                "cpu": cpu,
+                "thread": threading.get_ident(),
+            })
+
+    def _aggregate(self, key):
+        groups = {}
+        with self._lock:
+            spans = list(self.spans)
+        for item in spans:
+            name = item[key]
+            if not name:
+                continue
+            group = groups.setdefault(name, {})
+            stage = group.setdefault(item["stage"], {"count": 0, "ms": 0.0, "cpuMs": 0.0, "maxMs": 0.0, "bytes": 0})
+            stage["count"] += 1
+            stage["ms"] += item["duration"] * 1000
+            stage["cpuMs"] += item["cpu"] * 1000
+            stage["maxMs"] = max(stage["maxMs"], item["duration"] * 1000)
+            stage["bytes"] += item["bytes"]
+        return groups
+
+    def by_stage(self):
+        """{stage: {count, ms, cpuMs, maxMs, bytes}} over the whole run."""
+        totals = {}
+        for stages in self._aggregate("host").values():
+            for stage, values in stages.items():
+                total = totals.setdefault(stage, {"count": 0, "ms": 0.0, "cpuMs": 0.0, "maxMs": 0.0, "bytes": 0})
+                total["count"] += values["count"]
+                total["ms"] += values["ms"]
+                total["cpuMs"] += values["cpuMs"]
+                total["maxMs"] = max(total["maxMs"], values["maxMs"])
+                total["bytes"] += values["bytes"]
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        return dict(sorted(totals.items(), key=lambda item: order.get(item[0], len(order))))
+
+    def by_host(self):
+        return self._aggregate("host")
+
+    def by_page(self):
+        return self._aggregate("url")
+
+    def summary(self):
+        with self._lock:
+            spans = list(self.spans)
+        end = max((item["start"] + item["duration"] for item in spans), default=0.0)
+        return {
+            "wallMs": round(end * 1000, 1),
+            "pages": len({item["url"] for item in spans if item["url"]}),
+            "bytes": sum(item["bytes"] for item in spans if item["stage"] == "download"),
+            "stages": self.by_stage(),
+        }
+
+    def to_json(self):
+        return json.dumps({
+            "summary": self.summary(),
+            "hosts": self.by_host(),
+            "pages": self.by_page(),
+            "spans": self.spans,
+            "profile": self.profile,
+        }, indent=2)
+
+    def to_trace_events(self):
+        """Chrome trace-event JSON (chrome://tracing, Perfetto): one complete event per span."""
+        events = [
+            {
+                "name": item["stage"],
+                "cat": item["host"],
+                "ph": "X",
+                "ts": round(item["start"] * 1e6),
+                "dur": round(item["duration"] * 1e6),
+                "pid": 1,
+                "tid": item["thread"],
+                "args": {"url": item["url"], "bytes": item["bytes"]},
+            }
+            for item in self.spans
+        ]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+def active():
+    return _current.get()
+
+
+@contextmanager
+def recording(recorder=None, profile=False):
+    """Make `recorder` (a new one by default) the target for spans in this context.
+
+    With `profile=True` the calling thread is also run under cProfile and
+    the top functions by cumulative time are kept in `recorder.profile`.
+    """
+    recorder = recorder or Recorder()
+    token = _current.set(recorder)
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield recorder
+    finally:
+        if profiler:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            recorder.profile = output.getvalue()
+        _current.reset(token)
+
+
+def record(stage, url, duration, nbytes=0, start=None, cpu=0.0):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.add(stage, url, start if start is not None else time.perf_counter() - duration, duration, nbytes, cpu)
+
+
+@contextmanager
+def span(stage, url=None, nbytes=0):
+    """Time the enclosed block as `stage` for `url` (a URL or bare host), wall clock and thread CPU."""
+    recorder = _current.get()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        recorder.add(stage, url, start, time.perf_counter() - start, nbytes, time.thread_time() - cpu)
+
+
+class _TimedConnectionMixin:
+    setup_time = 0.0
+
+    @property
+    def _perf_host(self):
+        # Match the netloc that request-level spans are keyed by
+        return self.host if self.port == self.default_port else f"{self.host}:{self.port}"
+
+    def _new_conn(self):
+        if _current.get() is None:
+            return super()._new_conn()
+        # Resolve separately so DNS and TCP connect are reported apart, then try every
+        # address in turn as urllib3's create_connection does
+        dns_host = self._dns_host
+        start = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(dns_host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        except OSError:
+            # Let urllib3 resolve again and raise its own NameResolutionError
+            addresses = []
+        resolved = time.perf_counter()
+        record("dns", self._perf_host, resolved - start, start=start)
+        try:
+            for address in addresses[:-1]:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except ConnectTimeoutError:
+                    continue
+            self._dns_host = addresses[-1] if addresses else dns_host
+            return super()._new_conn()
+        finally:
+            self._dns_host = dns_host
+            self.setup_time = time.perf_counter() - start
+            record("connect", self._perf_host, self.setup_time - (resolved - start), start=resolved)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        if _current.get() is None:
+            return super().connect()
+        start = time.perf_counter()
+        super().connect()
+        # Whatever connect() spent beyond DNS and TCP is the TLS handshake
+        record("tls", self._perf_host, max(0.0, time.perf_counter() - start - self.setup_time))
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+def install_connection_timing(adapter):
+    """Make a requests HTTPAdapter open connections that report dns/connect/tls spans."""
+    adapter.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+    return adapter
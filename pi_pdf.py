@@ -0,0 +1,340 @@
+"""Package insert (prescribing information) PDF ingestion.
+
+Linked PI PDFs are streamed to disk in chunks under a size cap, then their
+text is extracted one page at a time and written to a text file named by
+the PDF's content hash. Each URL remembers its hash and validators, so a
+later run sends a conditional request and reuses the extracted text
+instead of downloading and parsing the document again. The numbered
+sections of the full prescribing information are mapped onto drug schema
+fields.
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+
+import perf
+import politeness
+from async_crawler import _pool
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # optional dependency
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+PI_CACHE_DIR = os.environ.get("PI_CACHE_DIR", os.path.join(".cache", "package_inserts"))
+PI_MAX_BYTES = int(os.environ.get("PI_MAX_BYTES", 50 * 1024 * 1024))
+PI_TTL = int(os.environ.get("PI_TTL", 7 * 86400))
+CHUNK_SIZE = 64 * 1024
+MAX_SECTION_CHARS = 20000
+MAX_TEXT_CHARS = 1500
+
+# Full prescribing information section titles and the schema field each one feeds
+SECTION_FIELDS = {
+    "INDICATIONS AND USAGE": "approvedIndications",
+    "DOSAGE AND ADMINISTRATION": "administration",
+    "DOSAGE FORMS AND STRENGTHS": "dosageForm",
+    "WARNINGS AND PRECAUTIONS": "warnings",
+    "ADVERSE REACTIONS": "sideEffects",
+    "MECHANISM OF ACTION": "mechanismOfAction",
+}
+SECTION_RE = re.compile(
+    r"^\s*(?:\d{1,2}(?:\.\d{1,2})?\s+|-+\s*)?(" + "|".join(SECTION_FIELDS) + r")\s*-*\s*$", re.I
+)
+# Any other numbered top-level heading ("8 USE IN SPECIFIC POPULATIONS") ends a section
+OTHER_SECTION_RE = re.compile(r"^\s*\d{1,2}\s+[A-Z][A-Z ,&/()-]{3,}$")
+SUBSECTION_RE = re.compile(r"^\s*(\d{1,2})\.(\d{1,2})\s+(\S.{2,100})$")
+BOXED_WARNING_RE = re.compile(r"^\s*WARNING(?:S)?:\s*([A-Z][A-Z ,;&/()-]{3,})$")
+COMMON_ADVERSE_RE = re.compile(
+    r"most common adverse (?:reactions|events)[^.:]*?(?:are|were|include|included)\s*:?\s*([^.]+)", re.I
+)
+BULLET_RE = re.compile(r"^[\s•●▪◦*\-]+")
+
+
+class PackageInsertStore:
+    """Remembers which content hash each PI URL resolved to, with its validators."""
+
+    def __init__(self, directory=PI_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, etag, last_modified, fetched_at FROM documents WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"content_hash": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3]}
+
+    def put(self, url, content_hash, etag=None, last_modified=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (url, content_hash, etag, last_modified, time.time()),
+            )
+            self._conn.commit()
+
+    def text_path(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}.txt")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PackageInsertStore()
+        return _store
+
+
+def download(url, directory, max_bytes=PI_MAX_BYTES, headers=None, timeout=60):
+    """Stream a PDF into `directory` without holding it in memory.
+
+    Returns (path, content_hash, response headers), or None when the server
+    answers 304 to the conditional `headers`. Raises ValueError when the
+    document is over `max_bytes` or is not a PDF.
+    """
+    policy = politeness.policy_for(url)
+    policy.wait()
+    session = _pool.session_for(url)
+    with session.get(url, headers=headers or {}, stream=True, timeout=timeout) as response:
+        policy.record(response.status_code, response.headers)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ValueError(f"{url} is {int(length)} bytes, over the {max_bytes} byte limit")
+
+        digest = hashlib.sha256()
+        size = 0
+        start = time.perf_counter()
+        fd, path = tempfile.mkstemp(suffix=".pdf.part", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if size == 0 and not chunk.lstrip().startswith(b"%PDF"):
+                        raise ValueError(f"{url} is not a PDF")
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"{url} exceeded the {max_bytes} byte limit")
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        perf.record("download", url, time.perf_counter() - start, size, start=start)
+        return path, digest.hexdigest(), response.headers
+
+
+def extract_text(pdf_path, text_path):
+    """Write the PDF's text to `text_path` one page at a time, pages separated by form feeds."""
+    if PdfReader is None:
+        raise RuntimeError("pypdf is required to read package insert PDFs (pip install pypdf)")
+    reader = PdfReader(pdf_path)
+    partial = text_path + ".part"
+    with open(partial, "w", encoding="utf-8") as out:
+        for number, page in enumerate(reader.pages):
+            if number:
+                out.write("\f")
+            try:
+                out.write(page.extract_text() or "")
+            except Exception as e:
+                logger.warning("Could not extract page %d of %s: %s", number + 1, pdf_path, e)
+            out.write("\n")
+    os.replace(partial, text_path)
+
+
+def fetch_text_path(url, store=None, max_bytes=PI_MAX_BYTES, ttl=PI_TTL):
+    """Return the path of the extracted text for a PI URL, downloading it only when needed."""
+    store = store or get_store()
+    known = store.get(url)
+    if known and os.path.exists(store.text_path(known["content_hash"])):
+        if time.time() - known["fetched_at"] < ttl:
+            return store.text_path(known["content_hash"])
+        headers = {}
+        if known["etag"]:
+            headers["If-None-Match"] = known["etag"]
+        if known["last_modified"]:
+            headers["If-Modified-Since"] = known["last_modified"]
+    else:
+        known, headers = None, {}
+    if PdfReader is None:
+        # A download could not be parsed or cached, so it would be repeated on every run
+        if known:
+            return store.text_path(known["content_hash"])
+        raise RuntimeError("pypdf is required to read package insert PDFs (pip install pypdf)")
+
+    result = download(url, store.directory, max_bytes, headers)
+    if result is None:
+        store.put(url, known["content_hash"], known["etag"], known["last_modified"])
+        return store.text_path(known["content_hash"])
+
+    pdf_path, content_hash, response_headers = result
+    text_path = store.text_path(content_hash)
+    try:
+        # The same document may be served from several URLs; parse it once
+        if not os.path.exists(text_path):
+            with perf.span("extract", url):
+                extract_text(pdf_path, text_path)
+    finally:
+        os.remove(pdf_path)
+    store.put(url, content_hash, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+    return text_path
+
+
+def read_sections(lines):
+    """Collect the schema-relevant sections from an iterable of PI text lines.
+
+    Titles appear in the highlights, the table of contents and the full
+    prescribing information; the longest occurrence of each section wins.
+    Returns {field: {"text": str, "subsections": [titles]}} plus a
+    "boxedWarnings" list.
+    """
+    sections = {}
+    boxed = []
+    current = None
+
+    def close():
+        if current is None:
+            return
+        best = sections.get(current["field"])
+        text = " ".join(current["lines"]).strip()
+        if best is None or len(text) > len(best["text"]):
+            sections[current["field"]] = {"text": text, "subsections": current["subsections"]}
+
+    for raw in lines:
+        line = raw.replace("\f", "").strip()
+        if not line:
+            continue
+        boxed_match = BOXED_WARNING_RE.match(line)
+        if boxed_match:
+            title = boxed_match.group(1).strip().capitalize()
+            if title not in boxed:
+                boxed.append(title)
+            continue
+        heading = SECTION_RE.match(line)
+        if heading:
+            close()
+            current = {"field": SECTION_FIELDS[heading.group(1).upper()], "lines": [], "subsections": [], "size": 0}
+            continue
+        if OTHER_SECTION_RE.match(line):
+            close()
+            current = None
+            continue
+        subsection = SUBSECTION_RE.match(line)
+        if subsection and current and current["field"] == "mechanismOfAction":
+            # 12.2 Pharmacodynamics and later subsections are not mechanism text
+            close()
+            current = None
+            continue
+        if current is None or current["size"] > MAX_SECTION_CHARS:
+            continue
+        if subsection:
+            current["subsections"].append(subsection.group(3).strip())
+        else:
+            current["lines"].append(line)
+            current["size"] += len(line)
+    close()
+    sections["boxedWarnings"] = boxed
+    return sections
+
+
+def _sentences(text, limit=10):
+    parts = [part.strip() for part in re.split(r"(?<=[.;])\s+", text) if len(part.strip()) > 3]
+    return parts[:limit]
+
+
+def _truncate(text):
+    return text if len(text) <= MAX_TEXT_CHARS else text[:MAX_TEXT_CHARS].rsplit(" ", 1)[0] + "…"
+
+
+def schema_fields(sections):
+    """Turn read_sections() output into drug schema field values."""
+    fields = {}
+    indications = sections.get("approvedIndications")
+    if indications:
+        fields["approvedIndications"] = indications["subsections"] or _sentences(indications["text"])
+
+    warnings = list(sections.get("boxedWarnings", []))
+    if sections.get("warnings"):
+        warnings += sections["warnings"]["subsections"]
+    if warnings:
+        fields["warnings"] = warnings
+
+    adverse = sections.get("sideEffects")
+    if adverse:
+        common = COMMON_ADVERSE_RE.search(adverse["text"])
+        if common:
+            items = re.split(r",|;|\band\b", re.sub(r"\([^)]*\)", "", common.group(1)))
+            fields["sideEffects"] = [item.strip() for item in items if item.strip()]
+        elif adverse["subsections"]:
+            fields["sideEffects"] = adverse["subsections"]
+
+    forms = sections.get("dosageForm")
+    if forms:
+        items = [BULLET_RE.sub("", item).strip() for item in re.split(r"\s*[•●▪]\s*", forms["text"])]
+        fields["dosageForm"] = [item for item in items if len(item) > 3][:10]
+
+    for field in ("administration", "mechanismOfAction"):
+        if sections.get(field) and sections[field]["text"]:
+            fields[field] = _truncate(sections[field]["text"])
+    return fields
+
+
+def parse_package_insert(url, store=None):
+    """Download (if needed) and parse a PI PDF into drug schema field values."""
+    with open(fetch_text_path(url, store), encoding="utf-8") as lines:
+        return schema_fields(read_sections(lines))
+
+
+def enrich_schema(schema, store=None):
+    """Fill drug schema fields from the PDFs in schema["packageInsertURL"].
+
+    The PI is authoritative: its values replace scalar fields and are listed
+    ahead of anything found on the website. Returns the URLs that failed.
+    """
+    urls = schema.get("packageInsertURL") or []
+    if isinstance(urls, str):
+        urls = [urls]
+    failed = []
+    for url in urls:
+        if not url.lower().split("?")[0].endswith(".pdf"):
+            continue
+        try:
+            fields = parse_package_insert(url, store)
+        except Exception as e:
+            logger.warning("Could not ingest package insert %s: %s", url, e)
+            failed.append(url)
+            continue
+        for field, value in fields.items():
+            if isinstance(value, list):
+                existing = schema.get(field) or []
+                if isinstance(existing, str):
+                    existing = [existing]
+                schema[field] = list(dict.fromkeys(value + existing))
+            else:
+                schema[field] = value
+    return failed
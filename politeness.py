@@ -0,0 +1,224 @@
+"""Per-host politeness: cached robots.txt, Crawl-delay and adaptive throttling.
+
+Every crawl in the process (all tabs, sessions, batch workers and jobs)
+shares one HostPolicy per host. A policy spaces requests to its current
+rate, never faster than the host's robots.txt Crawl-delay. When the host
+answers 429 or 503 the rate is halved and any Retry-After is honoured up
+to MAX_RETRY_AFTER; a host asking for a longer pause is skipped (requests
+to it raise HostUnavailable) until the pause is over. While the host stays
+healthy the rate ramps back up towards RATE_LIMIT.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from urllib import robotparser
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = float(os.environ.get("RATE_LIMIT", 2))
+RESPECT_ROBOTS_TXT = os.environ.get("RESPECT_ROBOTS_TXT", "True").lower() in ("1", "true", "yes")
+ROBOTS_TTL = int(os.environ.get("ROBOTS_TTL", 86400))
+ROBOTS_RETRY = int(os.environ.get("ROBOTS_RETRY", 300))
+MAX_RETRY_AFTER = int(os.environ.get("MAX_RETRY_AFTER", 300))
+MIN_RATE = 0.05
+RAMP_EVERY = 10
+RAMP_FACTOR = 1.25
+THROTTLE_STATUSES = (429, 503)
+
+
+class HostUnavailable(requests.RequestException):
+    """The host asked for a pause longer than MAX_RETRY_AFTER, so it is skipped rather than waited for."""
+
+
+def parse_retry_after(value):
+    """Return a Retry-After header (seconds or HTTP date) as seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RobotsCache:
+    """robots.txt parsers per host, refreshed after `ttl` seconds.
+
+    A robots.txt that could not be fetched because of a server or network
+    error disallows the whole host (RFC 9309 section 2.3.1.4) and is tried
+    again after `retry` seconds.
+    """
+
+    def __init__(self, ttl=ROBOTS_TTL, timeout=10, retry=ROBOTS_RETRY):
+        self.ttl = ttl
+        self.retry = retry
+        self.timeout = timeout
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._host_locks = {}
+
+    def get(self, url):
+        parts = urlparse(url)
+        origin = f"{parts.scheme}://{parts.netloc.lower()}"
+        with self._lock:
+            host_lock = self._host_locks.setdefault(origin, threading.Lock())
+
+        # One fetch per host even when many threads ask at once
+        with host_lock:
+            entry = self._entries.get(origin)
+            if entry and time.time() < entry[1]:
+                return entry[0]
+            parser, ttl = self._fetch(origin)
+            self._entries[origin] = (parser, time.time() + ttl)
+            return parser
+
+    def _fetch(self, origin):
+        """Return the host's parser and how long it may be cached."""
+        # Imported here because async_crawler itself depends on this module
+        from async_crawler import _pool
+
+        parser = robotparser.RobotFileParser(f"{origin}/robots.txt")
+        try:
+            # The crawler's own session, so the host sees the crawler's User-Agent
+            response = _pool.session_for(parser.url).get(parser.url, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning("Could not fetch %s, disallowing the host for %ds: %s", parser.url, self.retry, e)
+            parser.disallow_all = True
+            return parser, self.retry
+        if response.status_code == 429 or response.status_code >= 500:
+            logger.warning("%s answered %s, disallowing the host for %ds", parser.url, response.status_code, self.retry)
+            parser.disallow_all = True
+            return parser, self.retry
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        parser.modified()
+        return parser, self.ttl
+
+
+class HostPolicy:
+    def __init__(self, host, max_rate=RATE_LIMIT, crawl_delay=None):
+        self.host = host
+        self.base_rate = max_rate
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.crawl_delay = None
+        # The robots.txt parser the Crawl-delay was read from
+        self.robots = None
+        self.next_time = 0.0
+        self.blocked_until = 0.0
+        self.healthy_streak = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self.set_crawl_delay(crawl_delay)
+
+    def set_crawl_delay(self, crawl_delay):
+        """Apply a (new) Crawl-delay, which is a hard floor on the spacing between requests."""
+        with self._lock:
+            self.crawl_delay = crawl_delay
+            self.max_rate = min(self.base_rate, 1.0 / crawl_delay) if crawl_delay else self.base_rate
+            self.rate = min(self.rate, self.max_rate)
+
+    def reserve(self):
+        """Book the next request slot and return how many seconds to wait for it.
+
+        Raises HostUnavailable while the host's Retry-After pause exceeds MAX_RETRY_AFTER.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.blocked_until - now > MAX_RETRY_AFTER:
+                raise HostUnavailable(f"{self.host} asked to wait {self.blocked_until - now:.0f}s")
+            start = max(now, self.next_time, self.blocked_until)
+            self.next_time = start + 1.0 / self.rate
+            return start - now
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    def record(self, status_code, headers=None):
+        """Adapt the rate to a response: back off on 429/503, ramp up when healthy."""
+        with self._lock:
+            if status_code in THROTTLE_STATUSES:
+                self._back_off(parse_retry_after((headers or {}).get("Retry-After")))
+                logger.info("%s answered %s, slowing to %.2f req/s", self.host, status_code, self.rate)
+            elif status_code < 500:
+                self.healthy_streak += 1
+                if self.healthy_streak >= RAMP_EVERY and self.rate < self.max_rate:
+                    self.rate = min(self.max_rate, self.rate * RAMP_FACTOR)
+                    self.healthy_streak = 0
+
+    def record_error(self):
+        """Back off after a connection error or timeout, as for a 503 without Retry-After."""
+        with self._lock:
+            self._back_off(None)
+            logger.info("%s failed to respond, slowing to %.2f req/s", self.host, self.rate)
+
+    def _back_off(self, retry_after):
+        self.throttled += 1
+        self.healthy_streak = 0
+        self.rate = max(MIN_RATE, self.rate / 2)
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        if pause > MAX_RETRY_AFTER:
+            logger.warning("%s asked to wait %.0fs, skipping it until then", self.host, pause)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def to_dict(self):
+        return {
+            "host": self.host,
+            "rate": round(self.rate, 3),
+            "maxRate": self.max_rate,
+            "crawlDelay": self.crawl_delay,
+            "throttled": self.throttled,
+        }
+
+
+robots_cache = RobotsCache()
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def allowed(url, user_agent="*"):
+    """Return whether robots.txt lets `user_agent` fetch `url`."""
+    return robots_cache.get(url).can_fetch(user_agent, url)
+
+
+def policy_for(url, user_agent="*", respect_robots=RESPECT_ROBOTS_TXT):
+    """Return the process-wide HostPolicy for a URL's host."""
+    host = urlparse(url).netloc.lower()
+    with _policies_lock:
+        policy = _policies.get(host)
+    if policy is None:
+        with _policies_lock:
+            policy = _policies.setdefault(host, HostPolicy(host, RATE_LIMIT))
+    if respect_robots:
+        # Re-read Crawl-delay whenever robots.txt has been fetched again since the policy last saw it
+        parser = robots_cache.get(url)
+        if parser is not policy.robots:
+            crawl_delay = parser.crawl_delay(user_agent)
+            policy.set_crawl_delay(float(crawl_delay) if crawl_delay else None)
+            policy.robots = parser
+    return policy
+
+
+def policies():
+    with _policies_lock:
+        return [policy.to_dict() for policy in _policies.values()]
@@ -0,0 +1,70 @@
+"""Single-pass brand/generic name matching over the product catalog.
+
+All brand and generic names are compiled into one case-insensitive
+alternation, so finding every product mentioned on a page is a single scan
+of the content instead of one substring search per product.
+"""
+import re
+from functools import lru_cache
+
+
+class ProductMatcher:
+    def __init__(self, products):
+        # products: iterable of (brandName, genericName) pairs
+        products = list(products)
+        self._by_name = {}
+        for brand, generic in products:
+            for name in (brand, generic):
+                if name:
+                    self._by_name.setdefault(name.lower(), (brand, generic))
+        self._brands = sorted({brand.lower(): (brand, generic) for brand, generic in products}.items())
+
+        # Longest names first so "ado-trastuzumab emtansine" wins over "trastuzumab"
+        names = sorted(self._by_name, key=len, reverse=True)
+        alternation = "|".join(re.escape(name) for name in names)
+        self._pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)", re.IGNORECASE) if names else None
+
+    def find(self, content):
+        """Return every product mentioned in `content`, most mentioned first.
+
+        Each entry has brandName, genericName, count and the (start, end)
+        positions of each match.
+        """
+        if not self._pattern or not content:
+            return []
+        mentions = {}
+        for match in self._pattern.finditer(content):
+            brand, generic = self._by_name[match.group(0).lower()]
+            entry = mentions.get(brand)
+            if entry is None:
+                entry = mentions[brand] = {"brandName": brand, "genericName": generic, "count": 0, "positions": []}
+            entry["count"] += 1
+            entry["positions"].append(match.span())
+        return sorted(mentions.values(), key=lambda m: (-m["count"], m["positions"][0][0]))
+
+    def find_in_domain(self, domain):
+        """Return the product whose brand name appears in a hostname, if any."""
+        domain = domain.lower()
+        for brand_lower, (brand, generic) in self._brands:
+            if brand_lower in domain:
+                return {"brandName": brand, "genericName": generic}
+        return None
+
+
+@lru_cache(maxsize=8)
+def _build(products):
+    return ProductMatcher(products)
+
+
+def get_matcher(catalog):
+    """Return a cached matcher for a {category: [product, ...]} catalog."""
+    products = tuple(
+        (product["brandName"], product.get("genericName") or "")
+        for items in catalog.values()
+        for product in items
+    )
+    return _build(products)
+
+
+def find_products(content, catalog):
+    return get_matcher(catalog).find(content)
@@ -0,0 +1,118 @@
+"""Incremental merging of per-page schemas with provenance.
+
+Each page's schema is folded in as soon as it is extracted. List items are
+deduplicated through a dict keyed by a normalised form of the value (case,
+whitespace and punctuation ignored), so a merge costs time proportional to
+the page's own items rather than to everything merged so far. Every value
+remembers which URLs it came from and how often it was seen; a scalar field
+takes the value with the most evidence behind it, the first one seen
+winning ties.
+"""
+import re
+import json
+import copy
+
+import perf
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+EMPTY_VALUES = (None, "", "Not found")
+
+
+def normalize(value):
+    """Dedup key for a value: case, whitespace and punctuation insensitive for strings."""
+    if isinstance(value, str):
+        return NON_WORD_RE.sub(" ", value.casefold()).strip()
+    return json.dumps(value, sort_keys=True)
+
+
+class _Candidates:
+    """Distinct values for one field, in first-seen order, with their evidence."""
+
+    def __init__(self):
+        self.values = {}
+
+    def add(self, value, source, weight):
+        key = normalize(value)
+        if not key:
+            return
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = {"value": value, "count": 0, "weight": 0.0, "sources": {}}
+        entry["count"] += 1
+        entry["weight"] += weight
+        if source is not None:
+            entry["sources"][source] = entry["sources"].get(source, 0) + 1
+
+    def best(self):
+        # max() keeps the first maximal entry, so earlier values win ties
+        if not self.values:
+            return None
+        return max(self.values.values(), key=lambda entry: entry["weight"])["value"]
+
+    def all(self):
+        return [entry["value"] for entry in self.values.values()]
+
+    def provenance(self):
+        return [
+            {"value": entry["value"], "count": entry["count"], "sources": list(entry["sources"])}
+            for entry in self.values.values()
+        ]
+
+
+class SchemaMerger:
+    """Fold page schemas into one combined schema.
+
+    `template` supplies the combined schema's fields and empty defaults
+    (for example ct_extract.CT_SCHEMA); fields not in it are added as they
+    appear.
+    """
+
+    def __init__(self, template=None):
+        self.template = copy.deepcopy(template or {})
+        self.pages = 0
+        self._lists = {}
+        self._scalars = {}
+        self._nested = {}
+
+    def add(self, schema, source=None, weight=1.0):
+        """Merge one page's schema; `weight` scales its evidence for scalar fields."""
+        with perf.span("merge", source):
+            self._add(schema, source, weight)
+        return self
+
+    def _add(self, schema, source, weight):
+        self.pages += 1
+        for key, value in schema.items():
+            if isinstance(value, dict):
+                nested = self._nested.get(key)
+                if nested is None:
+                    nested = self._nested[key] = SchemaMerger(self.template.get(key))
+                nested._add(value, source, weight)
+            elif isinstance(value, list):
+                candidates = self._lists.setdefault(key, _Candidates())
+                for item in value:
+                    if item not in EMPTY_VALUES:
+                        candidates.add(item, source, weight)
+            elif value not in EMPTY_VALUES:
+                self._scalars.setdefault(key, _Candidates()).add(value, source, weight)
+
+    def result(self):
+        """The combined schema: lists unioned in first-seen order, best-supported scalars."""
+        combined = copy.deepcopy(self.template)
+        for key, candidates in self._lists.items():
+            combined[key] = candidates.all()
+        for key, candidates in self._scalars.items():
+            combined[key] = candidates.best()
+        for key, nested in self._nested.items():
+            combined[key] = nested.result()
+        return combined
+
+    def provenance(self):
+        """{field: [{value, count, sources}]} for every value that was merged."""
+        sources = {}
+        for key, candidates in list(self._lists.items()) + list(self._scalars.items()):
+            sources[key] = candidates.provenance()
+        for key, nested in self._nested.items():
+            sources[key] = nested.provenance()
+        return sources
+
@@ -0,0 +1,200 @@
+"""Persistent full-text index of crawled pages and extracted schemas.
+
+Pages, drug schemas and clinical trial schemas are stored in SQLite with an
+FTS5 table holding one row per page or per schema field, so questions such
+as "which products mention hepatotoxicity in their warnings" are answered
+from past crawls with a ranked local query instead of a new crawl.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+SEARCH_INDEX_PATH = os.environ.get("SEARCH_INDEX_PATH", os.path.join(".cache", "search_index.sqlite3"))
+KINDS = ("page", "drug", "trial")
+# bm25 column weights: kind, url, title, product, field, body
+RANK_WEIGHTS = (0.0, 0.0, 5.0, 3.0, 0.0, 1.0)
+
+
+def quote_query(query):
+    """Turn free text into an FTS5 query of quoted terms, so punctuation cannot break it."""
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*").replace('"', '""')
+        if term:
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def schema_fields(schema, prefix=""):
+    """Yield (field, text) pairs for a schema, nested dicts as dotted names."""
+    for key, value in schema.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from schema_fields(value, f"{name}.")
+        elif isinstance(value, list):
+            items = [item if isinstance(item, str) else json.dumps(item) for item in value]
+            if items:
+                yield name, "\n".join(items)
+        elif value not in (None, ""):
+            yield name, str(value)
+
+
+class SearchIndex:
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                kind TEXT,
+                url TEXT,
+                title TEXT,
+                product TEXT,
+                data TEXT,
+                indexed_at REAL,
+                rowids TEXT,
+                PRIMARY KEY (kind, url)
+            )"""
+        )
+        # Indexes created before rowids were tracked
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)")]
+        if "rowids" not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN rowids TEXT")
+        self._conn.execute(
+            """CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5(
+                kind UNINDEXED,
+                url UNINDEXED,
+                title,
+                product,
+                field UNINDEXED,
+                body,
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            )"""
+        )
+        # Field names per kind, so listing them does not scan every FTS row
+        has_fields = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'fields'").fetchone()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fields (kind TEXT, field TEXT, PRIMARY KEY (kind, field)) WITHOUT ROWID"
+        )
+        if not has_fields:
+            self._conn.execute("INSERT OR IGNORE INTO fields SELECT DISTINCT kind, field FROM entries")
+        self._conn.commit()
+
+    def _replace(self, kind, url, title, product, data, rows):
+        with self._lock:
+            # Filtering entries on its UNINDEXED columns would scan the whole
+            # table, so a document's FTS rows are deleted by the rowids kept for it
+            previous = self._conn.execute(
+                "SELECT rowids FROM documents WHERE kind = ? AND url = ?", (kind, url)
+            ).fetchone()
+            if previous and previous[0] is not None:
+                self._conn.executemany("DELETE FROM entries WHERE rowid = ?", [(rowid,) for rowid in json.loads(previous[0])])
+            elif previous:
+                self._conn.execute("DELETE FROM entries WHERE kind = ? AND url = ?", (kind, url))
+            rowids = [
+                self._conn.execute(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)", (kind, url, title, product, field, body)
+                ).lastrowid
+                for field, body in rows
+            ]
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO fields VALUES (?, ?)", [(kind, field) for field in {field for field, _ in rows}]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (kind, url, title, product, data, indexed_at, rowids) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, url, title, product, json.dumps(data), time.time(), json.dumps(rowids)),
+            )
+            self._conn.commit()
+
+    def add_page(self, url, title, content):
+        """Index a page's cleaned content, replacing any earlier copy."""
+        self._replace("page", url, title or "", "", {"url": url, "title": title}, [("content", content or "")])
+
+    def add_schema(self, kind, url, schema, product=None, title=None):
+        """Index each field of a drug ("drug") or trial ("trial") schema."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown document kind: {kind}")
+        self._replace(kind, url, title or "", product or "", schema, list(schema_fields(schema)))
+
+    def search(self, query, kind=None, field=None, limit=20):
+        """Return the best matches for `query` with highlighted snippets."""
+        match = quote_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT kind, url, title, product, field, "
+            "snippet(entries, 5, '**', '**', '…', 16), bm25(entries, ?, ?, ?, ?, ?, ?) AS score "
+            "FROM entries WHERE entries MATCH ?"
+        )
+        params = list(RANK_WEIGHTS) + [match]
+        if kind:
+            sql += " AND kind = ?"
+            params.append(kind)
+        if field:
+            sql += " AND (field = ? OR field LIKE ?)"
+            params.extend([field, f"{field}.%"])
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {"kind": kind, "url": url, "title": title, "product": product, "field": field, "snippet": snippet,
+             "score": round(-score, 3)}
+            for kind, url, title, product, field, snippet, score in rows
+        ]
+
+    def pages_since(self, rowid, batch=500):
+        """Yield (rowid, url, title, content) for pages indexed after `rowid`, oldest first."""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, url, title, body FROM entries WHERE rowid > ? AND kind = 'page' ORDER BY rowid LIMIT ?",
+                    (rowid, batch),
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            rowid = rows[-1][0]
+
+    def get(self, kind, url):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM documents WHERE kind = ? AND url = ?", (kind, url)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def fields(self, kind=None):
+        """Distinct schema field names, for narrowing a search.
+
+        Names are never removed, so a field no document has any more can
+        still be listed; searching it simply finds nothing.
+        """
+        sql = "SELECT DISTINCT field FROM fields"
+        params = ()
+        if kind:
+            sql += " WHERE kind = ?"
+            params = (kind,)
+        with self._lock:
+            return sorted(row[0] for row in self._conn.execute(sql, params))
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT kind, COUNT(*) FROM documents GROUP BY kind").fetchall())
+        return {kind: counts.get(kind, 0) for kind in KINDS}
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide index, creating it on first use."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = SearchIndex()
+        return _default_index
@@ -0,0 +1,159 @@
+"""Headless HTTP API for llms.txt and schema generation.
+
+POST /generate queues a job and returns its id immediately; crawls run on
+the shared worker pool in jobs.py. Poll GET /jobs/<id> for status and
+fetch finished files from GET /jobs/<id>/result or /download/<filename>.
+GET /search queries the local index of past crawls, and
+GET /jobs/<id>/perf returns a job's per-stage timings (?format=trace for
+Chrome trace events); pass "profile": true to /generate to add cProfile output.
+"""
+import os
+import json
+import logging
+from urllib.parse import urlparse
+
+from flask import Flask, jsonify, render_template, request, send_from_directory, abort
+
+import ct_extract
+import llms_txt
+import search_index
+from jobs import JobManager, QueueFullError
+
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+jobs = JobManager()
+
+
+def is_valid_url(url):
+    try:
+        result = urlparse(url)
+        return all([result.scheme, result.netloc])
+    except Exception:
+        return False
+
+
+def output_file(job, suffix):
+    host = urlparse(job.params["url"]).netloc.replace(":", "_")
+    return os.path.join(llms_txt.OUTPUT_DIR, f"{host}_{job.id[:8]}_{suffix}")
+
+
+def run_llms_txt(job, url, depth, max_pages):
+    path = output_file(job, "llms.txt")
+    for event in llms_txt.generate(url, depth=depth, max_pages=max_pages, output_path=path):
+        job.progress = event
+    return path
+
+
+def run_clinical_trial(job, url, depth, max_pages):
+    schema = ct_extract.extract_trial(url, depth=depth, max_pages=max_pages)
+    if schema is None:
+        raise RuntimeError(f"Failed to fetch {url}")
+    path = output_file(job, "clinical_trial.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(schema, output, indent=2)
+    return path
+
+
+RUNNERS = {
+    "llms_txt": run_llms_txt,
+    "clinical_trial": run_clinical_trial,
+}
+
+
+def job_payload(job):
+    payload = job.to_dict()
+    if job.status == "done":
+        filename = os.path.basename(job.result)
+        payload["filename"] = filename
+        payload["download_url"] = f"/download/{filename}"
+    return payload
+
+
+@app.route("/")
+def index():
+    return render_template("index.html")
+
+
+@app.route("/generate", methods=["POST"])
+def generate():
+    data = request.get_json(silent=True) or request.form
+    url = (data.get("url") or "").strip()
+    kind = data.get("type", "llms_txt")
+
+    if not is_valid_url(url):
+        return jsonify({"success": False, "error": "Please enter a valid URL"}), 400
+    if kind not in RUNNERS:
+        return jsonify({"success": False, "error": f"Unknown job type: {kind}"}), 400
+
+    try:
+        depth = max(1, min(int(data.get("depth", 1)), 10))
+        max_pages = max(1, int(data.get("max_pages", llms_txt.LLMS_MAX_PAGES)))
+    except ValueError:
+        return jsonify({"success": False, "error": "depth and max_pages must be integers"}), 400
+
+    try:
+        job = jobs.submit(kind, RUNNERS[kind], profile=str(data.get("profile", "")).lower() in ("1", "true"),
+                          url=url, depth=depth, max_pages=max_pages)
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": f"Server busy: {e}"}), 503
+
+    return jsonify({"success": True, "job_id": job.id, "status_url": f"/jobs/{job.id}"}), 202
+
+
+@app.route("/search")
+def search():
+    query = request.args.get("q", "")
+    kind = request.args.get("kind") or None
+    if kind and kind not in search_index.KINDS:
+        return jsonify({"success": False, "error": f"kind must be one of {', '.join(search_index.KINDS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+    except ValueError:
+        return jsonify({"success": False, "error": "limit must be an integer"}), 400
+    results = search_index.get_index().search(query, kind=kind, field=request.args.get("field") or None, limit=limit)
+    return jsonify({"success": True, "results": results})
+
+
+@app.route("/jobs")
+def list_jobs():
+    return jsonify([job_payload(job) for job in jobs.list()])
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job_payload(job))
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    if job.status != "done":
+        return jsonify(job_payload(job)), 409
+    return send_from_directory(os.path.abspath(llms_txt.OUTPUT_DIR), os.path.basename(job.result), as_attachment=True)
+
+
+@app.route("/jobs/<job_id>/perf")
+def job_perf(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.perf is None:
+        abort(404)
+    if request.args.get("format") == "trace":
+        return app.response_class(job.perf.to_trace_events(), mimetype="application/json")
+    return app.response_class(job.perf.to_json(), mimetype="application/json")
+
+
+@app.route("/download/<path:filename>")
+def download(filename):
+    return send_from_directory(os.path.abspath(llms_txt.OUTPUT_DIR), filename, as_attachment=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    app.run(host="127.0.0.1", port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,261 @@
+"""Content similarity over the corpus of crawled pages.
+
+Pages held in the local search index are turned into TF-IDF vectors with
+the hashing trick: each term is hashed to one of SIMILARITY_DIM signed
+buckets, so vectors have a fixed width without a vocabulary, and document
+frequencies are counted in a larger hashed table. Normalised vectors are
+stored in one float32 matrix that grows as pages are crawled, and a query
+is a single matrix-vector product followed by a partial sort, which stays
+fast at hundreds of thousands of pages. Results are grouped into the
+site categories offered by the Find Similar Sites tab.
+"""
+import os
+import re
+import hashlib
+import logging
+import threading
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import urlparse
+
+import numpy as np
+
+import search_index
+import product_matcher
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_INDEX_PATH = os.environ.get("SIMILARITY_INDEX_PATH", os.path.join(".cache", "similarity_index.npz"))
+SIMILARITY_DIM = int(os.environ.get("SIMILARITY_DIM", 512))
+DF_BUCKETS = 1 << 20
+SAVE_EVERY = 1000
+PAGES_PER_SITE = 2
+TOKEN_RE = re.compile(r"[a-z][a-z0-9-]{1,30}")
+STOPWORDS = frozenset(
+    "the and for with that this from are was were been have has had not but you your our they their its "
+    "can may will all any more other such than then there these those into about also which who what when "
+    "where how use used using each per only over under both after before between".split()
+)
+
+MANUFACTURER_DOMAINS = ("gene.com", "roche.com", "genentech-access.com")
+# (category, pattern matched against the URL and title); a page can fall into several
+CATEGORY_RULES = [
+    ("Clinical trial databases", re.compile(
+        r"clinicaltrials\.gov|clinicaltrialsregister\.eu|isrctn\.com|trialsearch\.who\.int|forpatients\.roche|clinical[-_ ]?trials?", re.I)),
+    ("Prescribing information", re.compile(
+        r"prescribing[-_ ]?information|package[-_ ]?insert|dailymed|accessdata\.fda\.gov|_pi\.pdf|\bpi\.pdf|label\.pdf", re.I)),
+    ("Mechanism of action", re.compile(r"mechanism[-_ ]?of[-_ ]?action|\bmoa\b", re.I)),
+    ("Scientific publications", re.compile(
+        r"pubmed|ncbi\.nlm\.nih\.gov|nejm\.org|thelancet\.com|jamanetwork\.com|nature\.com|sciencedirect\.com|"
+        r"springer|wiley\.com|doi\.org|ascopubs\.org|ashpublications\.org", re.I)),
+    ("Healthcare professional resources", re.compile(
+        r"hcp|medical[-_ ]?professionals?|healthcare[-_ ]?professionals?|medscape|dosing|uptodate", re.I)),
+    ("Patient resources", re.compile(
+        r"patients?|rxlist|medlineplus|drugs\.com|webmd|support|financial[-_ ]?assistance|caregivers?", re.I)),
+]
+
+
+@lru_cache(maxsize=500000)
+def _term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def categories_for(url, title="", catalog=None, product_name=None):
+    """Return the Find Similar Sites categories a page belongs to."""
+    target = f"{url} {title}"
+    found = [category for category, pattern in CATEGORY_RULES if pattern.search(target)]
+    host = urlparse(url).netloc.lower()
+    if any(host == domain or host.endswith("." + domain) for domain in MANUFACTURER_DOMAINS):
+        found.append("Manufacturer resources")
+    if catalog:
+        brand = product_matcher.get_matcher(catalog).find_in_domain(host)
+        if brand:
+            if product_name and brand["brandName"].lower() != product_name.lower():
+                found.append("Competitive products")
+            else:
+                found.append("Official product websites")
+    return found
+
+
+class SimilarityIndex:
+    def __init__(self, dim=SIMILARITY_DIM, path=SIMILARITY_INDEX_PATH):
+        self.dim = dim
+        self.path = path
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.vectors = np.zeros((1024, dim), dtype=np.float32)
+        self.df = np.zeros(DF_BUCKETS, dtype=np.int32)
+        # Each row's df buckets, so a replaced page's terms can be taken out of df again
+        self.buckets = []
+        self.urls = []
+        self.titles = []
+        self.rows = {}
+        self.watermark = 0
+        self._unsaved = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self.urls)
+
+    def _load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if data["vectors"].shape[1] != self.dim:
+                    logger.info("Similarity index dimension changed, rebuilding")
+                    return
+                if "buckets" not in data:
+                    # Saved before each row's df buckets were kept, so a re-indexed page would skew df
+                    logger.info("Similarity index predates per-row df buckets, rebuilding")
+                    return
+                vectors = data["vectors"]
+                self.vectors = np.zeros((max(1024, len(vectors) * 2), self.dim), dtype=np.float32)
+                self.vectors[:len(vectors)] = vectors
+                self.df = data["df"]
+                self.buckets = np.split(data["buckets"], data["bucket_offsets"][1:-1])
+                self.urls = data["urls"].tolist()
+                self.titles = data["titles"].tolist()
+                self.watermark = int(data["watermark"])
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Could not load similarity index %s: %s", self.path, e)
+            return
+        self.rows = {url: row for row, url in enumerate(self.urls)}
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            count = len(self.urls)
+            partial = self.path + ".part.npz"
+            np.savez(
+                partial,
+                vectors=self.vectors[:count],
+                df=self.df,
+                buckets=np.concatenate(self.buckets) if count else np.zeros(0, dtype=np.int32),
+                bucket_offsets=np.cumsum([0] + [len(buckets) for buckets in self.buckets]),
+                urls=np.array(self.urls, dtype=str),
+                titles=np.array(self.titles, dtype=str),
+                watermark=self.watermark,
+            )
+            self._unsaved = 0
+        os.replace(partial, self.path)
+
+    def _weights(self, counts, documents):
+        """TF-IDF vector for a term Counter, L2-normalised."""
+        hashes = np.array([_term_hash(term) for term in counts], dtype=np.uint64)
+        tf = 1.0 + np.log(np.array(list(counts.values()), dtype=np.float32))
+        idf = np.log((1.0 + documents) / (1.0 + self.df[(hashes >> np.uint64(32)) % np.uint64(DF_BUCKETS)])) + 1.0
+        signs = np.where(hashes & np.uint64(1), 1.0, -1.0).astype(np.float32)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        np.add.at(vector, ((hashes >> np.uint64(1)) % np.uint64(self.dim)).astype(np.intp), signs * tf * idf)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def vectorize(self, text):
+        counts = Counter(tokenize(text))
+        if not counts:
+            return np.zeros(self.dim, dtype=np.float32)
+        return self._weights(counts, len(self.urls))
+
+    def add(self, url, text, title=""):
+        """Add or replace a page's vector."""
+        counts = Counter(tokenize(text))
+        if not counts:
+            return
+        buckets = (np.array([_term_hash(term) >> 32 for term in counts], dtype=np.uint64) % np.uint64(DF_BUCKETS)).astype(np.int32)
+        with self._lock:
+            row = self.rows.get(url)
+            if row is not None:
+                np.subtract.at(self.df, self.buckets[row].astype(np.intp), 1)
+            np.add.at(self.df, buckets.astype(np.intp), 1)
+            vector = self._weights(counts, len(self.urls) + (row is None))
+            if row is None:
+                row = len(self.urls)
+                if row == len(self.vectors):
+                    grown = np.zeros((row * 2, self.dim), dtype=np.float32)
+                    grown[:row] = self.vectors
+                    self.vectors = grown
+                self.urls.append(url)
+                self.titles.append(title or "")
+                self.buckets.append(buckets)
+                self.rows[url] = row
+            else:
+                self.titles[row] = title or ""
+                self.buckets[row] = buckets
+            self.vectors[row] = vector
+            self._unsaved += 1
+
+    def sync(self, index=None):
+        """Pull pages indexed since the last sync from the search index."""
+        index = index or search_index.get_index()
+        added = 0
+        with self._sync_lock:
+            for rowid, url, title, content in index.pages_since(self.watermark):
+                self.add(url, content, title)
+                self.watermark = rowid
+                added += 1
+            if self._unsaved >= SAVE_EVERY:
+                self.save()
+        return added
+
+    def query(self, vector, k=20, exclude=None):
+        """Return up to `k` (url, title, score) tuples by cosine similarity."""
+        with self._lock:
+            count = len(self.urls)
+            if not count or not vector.any():
+                return []
+            scores = self.vectors[:count] @ vector
+            if exclude in self.rows:
+                scores[self.rows[exclude]] = -1.0
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.urls[row], self.titles[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    def similar_to_url(self, url, k=20):
+        with self._lock:
+            row = self.rows.get(url)
+            vector = self.vectors[row].copy() if row is not None else None
+        if vector is None:
+            return []
+        return self.query(vector, k, exclude=url)
+
+    def similar_to_text(self, text, k=20):
+        return self.query(self.vectorize(text), k)
+
+
+def group(results, search_types, catalog=None, product_name=None, per_category=10):
+    """Group (url, title, score) results into categories, at most PAGES_PER_SITE pages per site."""
+    grouped = {}
+    per_site = Counter()
+    for url, title, score in results:
+        for category in categories_for(url, title, catalog, product_name):
+            if category not in search_types or len(grouped.get(category, [])) >= per_category:
+                continue
+            site = (category, urlparse(url).netloc.lower())
+            if per_site[site] >= PAGES_PER_SITE:
+                continue
+            per_site[site] += 1
+            grouped.setdefault(category, []).append({"name": title or urlparse(url).netloc, "url": url, "score": round(score, 3)})
+    return grouped
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """Return the process-wide index, synced with the search index."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = SimilarityIndex()
+    _default_index.sync()
+    return _default_index
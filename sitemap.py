@@ -0,0 +1,236 @@
+"""Sitemap-driven incremental recrawl.
+
+URLs are discovered from robots.txt `Sitemap:` entries (falling back to
+/sitemap.xml), following sitemap-index files and gzipped sitemaps. A
+per-URL store keeps each page's fetch time, `<lastmod>`, content hash and
+extracted schema, so later runs only fetch pages whose lastmod moved and
+only re-extract pages whose content actually changed. The site schema is
+then re-merged from the stored per-page schemas and diffed against the
+previous run.
+"""
+import io
+import os
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlparse
+
+import http_cache
+import politeness
+from async_crawler import AsyncCrawler
+from dedup import DedupIndex
+from page_model import ParsedPage
+from schema_merge import SchemaMerger
+
+logger = logging.getLogger(__name__)
+
+URL_STORE_PATH = os.environ.get("URL_STORE_PATH", os.path.join(".cache", "url_store.sqlite3"))
+# The sitemap protocol allows 50 MB uncompressed per file, well past FETCH_MAX_BYTES
+SITEMAP_MAX_BYTES = int(os.environ.get("SITEMAP_MAX_BYTES", 50 * 1024 * 1024))
+MAX_SITEMAPS = 50
+
+
+def _fetch(url):
+    politeness.policy_for(url).wait()
+    return http_cache.cached_get(url, max_bytes=SITEMAP_MAX_BYTES)
+
+
+def discover_sitemaps(site_url):
+    """Return sitemap URLs listed in robots.txt, or the conventional /sitemap.xml."""
+    robots_url = urljoin(site_url, "/robots.txt")
+    sitemaps = []
+    try:
+        response = _fetch(robots_url)
+        if response.ok:
+            for line in response.text.splitlines():
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "sitemap" and value.strip():
+                    sitemaps.append(value.strip())
+    except Exception as e:
+        logger.warning("Could not read %s: %s", robots_url, e)
+    return sitemaps or [urljoin(site_url, "/sitemap.xml")]
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_sitemap(content):
+    """Parse a (possibly gzipped) sitemap into ("sitemap"|"url", loc, lastmod) entries."""
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    entries = []
+    loc = lastmod = None
+    for _, element in ET.iterparse(io.BytesIO(content), events=("end",)):
+        name = _local_name(element.tag)
+        if name == "loc":
+            loc = (element.text or "").strip()
+        elif name == "lastmod":
+            lastmod = (element.text or "").strip()
+        elif name in ("url", "sitemap"):
+            if loc:
+                entries.append(("url" if name == "url" else "sitemap", loc, lastmod))
+            loc = lastmod = None
+            element.clear()
+    return entries
+
+
+def sitemap_urls(site_url, max_sitemaps=MAX_SITEMAPS):
+    """Return [(url, lastmod)] for every page listed in the site's sitemaps."""
+    queue = discover_sitemaps(site_url)
+    visited = set()
+    pages = {}
+    while queue and len(visited) < max_sitemaps:
+        sitemap_url = queue.pop(0)
+        if sitemap_url in visited:
+            continue
+        visited.add(sitemap_url)
+        try:
+            response = _fetch(sitemap_url)
+            if not response.ok:
+                logger.warning("Skipped sitemap %s: %s", sitemap_url, response.skipped or f"HTTP {response.status_code}")
+                continue
+            entries = parse_sitemap(response.content)
+        except Exception as e:
+            logger.warning("Could not parse sitemap %s: %s", sitemap_url, e)
+            continue
+        for kind, loc, lastmod in entries:
+            if kind == "sitemap":
+                queue.append(loc)
+            else:
+                pages.setdefault(loc, lastmod)
+    skipped = set(queue) - visited
+    if skipped:
+        logger.warning("Skipped %d sitemaps of %s past the limit of %d", len(skipped), site_url, max_sitemaps)
+    return list(pages.items())
+
+
+def diff_schemas(old, new):
+    """Return {field: change} for fields that differ between two merged schemas."""
+    changes = {}
+    for key in sorted(set(old) | set(new)):
+        before, after = old.get(key), new.get(key)
+        if before == after:
+            continue
+        if isinstance(before, list) or isinstance(after, list):
+            before, after = before or [], after or []
+            changes[key] = {
+                "added": [item for item in after if item not in before],
+                "removed": [item for item in before if item not in after],
+            }
+        else:
+            changes[key] = {"old": before, "new": after}
+    return changes
+
+
+class UrlStore:
+    def __init__(self, path=URL_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                site TEXT,
+                fetched_at REAL,
+                lastmod TEXT,
+                content_hash TEXT,
+                schema TEXT
+            )"""
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sites (site TEXT PRIMARY KEY, combined_schema TEXT, updated_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at, lastmod, content_hash, schema FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"fetched_at": row[0], "lastmod": row[1], "content_hash": row[2], "schema": json.loads(row[3] or "{}")}
+
+    def put(self, url, site, lastmod, content_hash, schema):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (url, site, time.time(), lastmod, content_hash, json.dumps(schema)),
+            )
+            self._conn.commit()
+
+    def site_schema(self, site):
+        with self._lock:
+            row = self._conn.execute("SELECT combined_schema FROM sites WHERE site = ?", (site,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def put_site_schema(self, site, combined_schema):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sites VALUES (?, ?, ?)", (site, json.dumps(combined_schema), time.time())
+            )
+            self._conn.commit()
+
+
+def incremental_crawl(site_url, extract_schema, store=None, max_pages=None, crawler=None):
+    """Refresh a site's combined schema, fetching only new or changed pages.
+
+    `extract_schema(page)` turns a ParsedPage into a per-page schema dict.
+    Returns the merged schema, the sources of each merged value, the URLs
+    in each change bucket and a field-level diff against the previous run.
+    """
+    store = store or UrlStore()
+    site = urlparse(site_url).netloc.lower()
+    entries = sitemap_urls(site_url)
+    if max_pages:
+        entries = entries[:max_pages]
+
+    report = {"new": [], "changed": [], "unchanged": [], "skipped": [], "duplicate": [], "failed": []}
+    previous = {url: store.get(url) for url, _ in entries}
+
+    # Pages whose sitemap lastmod has not moved are not fetched at all
+    to_fetch = []
+    for url, lastmod in entries:
+        stored = previous[url]
+        if stored and lastmod and stored["lastmod"] == lastmod:
+            report["skipped"].append(url)
+        else:
+            to_fetch.append(url)
+    lastmods = dict(entries)
+
+    def process_page(url, response):
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        stored = previous[url]
+        if stored and stored["content_hash"] == content_hash:
+            store.put(url, site, lastmods[url], content_hash, stored["schema"])
+            return "unchanged", []
+        store.put(url, site, lastmods[url], content_hash, extract_schema(ParsedPage.from_response(url, response)))
+        return ("changed" if stored else "new"), []
+
+    crawler = crawler or AsyncCrawler(dedup=DedupIndex())
+    for page in crawler.iter_fetch(to_fetch, process_page):
+        if page["duplicate_of"]:
+            # Its schema from an earlier run must not be merged any more; no hash, so it is compared afresh next time
+            store.put(page["url"], site, lastmods[page["url"]], None, {})
+            report["duplicate"].append(page["url"])
+        else:
+            report[page["data"] or "failed"].append(page["url"])
+
+    merger = SchemaMerger()
+    for url, _ in entries:
+        stored = store.get(url)
+        if stored:
+            merger.add(stored["schema"], url)
+    combined_schema = merger.result()
+
+    diff = diff_schemas(store.site_schema(site), combined_schema)
+    store.put_site_schema(site, combined_schema)
+    return {"combined_schema": combined_schema, "provenance": merger.provenance(), "pages": report, "diff": diff}